@@ -0,0 +1,153 @@
+# exam_app/analytics.py
+"""
+Item analysis of the question bank (QuestionStats), computed in batches with NumPy.
+
+The graded answers (ExamAnswer, without the incomplete rows made by backfill_exam_answers) are read
+in chunks of CHUNK_SIZE exam results, in result ID order.
+Every chunk becomes a few NumPy arrays, and np.bincount counts the attempts, misses and
+correct answers of the passed / failed group per question in one pass each, instead of a
+Python loop over the rows. The counts are added to the stored QuestionStats rows, and the
+ID of the last result read is kept in a ProcessingWatermark, so the next run only reads the
+exams taken since then.
+
+This module imports NumPy at load time: import it lazily (the analyze_items command, or inside
+the view that starts a refresh), never from a module every worker loads at startup.
+"""
+import datetime
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ExamAnswer, ExamResult, ProcessingWatermark, QuestionStats
+
+# Name of the job in ProcessingWatermark
+WATERMARK_NAME = 'question_stats'
+
+# Number of ExamResult IDs whose answers are read at a time
+CHUNK_SIZE = 2000
+
+COUNT_FIELDS = ['attempts', 'misses', 'passed_attempts', 'passed_correct', 'failed_attempts', 'failed_correct']
+
+
+def _read_chunk(first_id, last_id):
+    """
+    Input: first_id, last_id (an ExamResult ID range, both included)
+    Output: (question ids, chosen choice ids with -1 for "no answer", is_correct, exam passed) as NumPy arrays.
+    Rows made by backfill_exam_answers are skipped: they only record the wrong answers of their result,
+    so they would count as a miss rate of 1.0 and put every such question in the failed group.
+    """
+    rows = list(ExamAnswer.objects.filter(result_id__gte=first_id, result_id__lte=last_id, backfilled=False)
+                .values_list('question_id', 'choice_id', 'is_correct', 'result__passed'))
+    if not rows:
+        return None
+    question_ids, choice_ids, correct, passed = zip(*rows)
+    return (np.fromiter(question_ids, dtype=np.int64, count=len(rows)),
+            np.fromiter((-1 if c is None else c for c in choice_ids), dtype=np.int64, count=len(rows)),
+            np.fromiter(correct, dtype=bool, count=len(rows)),
+            np.fromiter(passed, dtype=bool, count=len(rows)))
+
+
+def count_chunk(question_ids, choice_ids, correct, passed):
+    """
+    Counts one chunk of answers per question.
+    Input: the four arrays of _read_chunk (one element per answer).
+    Output: (questions, counts, distractors): questions is the array of distinct question IDs,
+    counts {field: array aligned with questions} for COUNT_FIELDS, and
+    distractors a list of (question id, choice id, times picked as a wrong answer).
+    """
+    # Dense index 0..n-1 per distinct question, so bincount needs no space for unused IDs
+    questions, index = np.unique(question_ids, return_inverse=True)
+    size = len(questions)
+
+    def count(mask=None):
+        weights = None if mask is None else mask.astype(np.int64)
+        return np.bincount(index, weights=weights, minlength=size).astype(np.int64)
+
+    failed = ~passed
+    counts = {
+        'attempts': count(),
+        'misses': count(~correct),
+        'passed_attempts': count(passed),
+        'passed_correct': count(passed & correct),
+        'failed_attempts': count(failed),
+        'failed_correct': count(failed & correct),
+    }
+
+    # Wrong answers that picked a choice (unanswered questions have no distractor)
+    picked = ~correct & (choice_ids >= 0)
+    distractors = []
+    if picked.any():
+        pairs, times = np.unique(np.stack([question_ids[picked], choice_ids[picked]], axis=1),
+                                 axis=0, return_counts=True)
+        distractors = [(int(q), int(c), int(n)) for (q, c), n in zip(pairs, times)]
+    return questions, counts, distractors
+
+
+def refresh_question_stats(full=False, chunk_size=CHUNK_SIZE, batch_size=1000):
+    """
+    Adds the answers of the exams taken since the last run to QuestionStats.
+    Input: full (True: forget the stored statistics and read the whole history again),
+    chunk_size (ExamResult IDs per read), batch_size (QuestionStats rows per write).
+    Output: A dict with the number of results read, questions updated and the new watermark.
+    """
+    start_after = 0 if full else ProcessingWatermark.get(WATERMARK_NAME)
+    settled = timezone.now() - datetime.timedelta(seconds=ProcessingWatermark.SETTLE_SECONDS)
+    end = ExamResult.objects.filter(id__gt=start_after, date_taken__lte=settled) \
+        .order_by('-id').values_list('id', flat=True).first()
+    if end is None:
+        return {'results': 0, 'questions': 0, 'watermark': start_after}
+    # Practice exams have no ExamAnswer rows (see views.take_exam), so only official results are read
+    result_count = ExamResult.objects.official().filter(id__gt=start_after, id__lte=end).count()
+
+    # 1. Count per chunk and add up per question (the totals are bank-sized, the history is never held)
+    totals = {}  # {question id: [attempts, misses, passed_attempts, passed_correct, failed_attempts, failed_correct]}
+    distractors = {}  # {question id: {choice id: count}}
+    for first_id in range(start_after + 1, end + 1, chunk_size):
+        chunk = _read_chunk(first_id, min(end, first_id + chunk_size - 1))
+        if chunk is None:
+            continue
+        questions, counts, picked = count_chunk(*chunk)
+        columns = np.stack([counts[field] for field in COUNT_FIELDS], axis=1).tolist()
+        for question_id, row in zip(questions.tolist(), columns):
+            total = totals.get(question_id)
+            if total is None:
+                totals[question_id] = row
+            else:
+                for i, value in enumerate(row):
+                    total[i] += value
+        for question_id, choice_id, times in picked:
+            per_choice = distractors.setdefault(question_id, {})
+            per_choice[choice_id] = per_choice.get(choice_id, 0) + times
+
+    # 2. Add the new counts to the stored rows and save them together with the watermark
+    with transaction.atomic():
+        # The watermark row is locked: two runs at the same time would count the same answers twice
+        current = ProcessingWatermark.lock(WATERMARK_NAME)
+        if not full and current != start_after:
+            raise RuntimeError(f"Another run moved the watermark from {start_after} to {current}; run again.")
+        if full:
+            QuestionStats.objects.all().delete()
+            existing = {}
+        else:
+            existing = QuestionStats.objects.select_for_update().in_bulk(list(totals))
+        rows = []
+        for question_id, row in totals.items():
+            stats = existing.get(question_id) or QuestionStats(question_id=question_id)
+            for field, value in zip(COUNT_FIELDS, row):
+                setattr(stats, field, getattr(stats, field) + int(value))
+            # JSON keys are strings
+            merged = dict(stats.distractor_counts)
+            for choice_id, times in distractors.get(question_id, {}).items():
+                merged[str(choice_id)] = merged.get(str(choice_id), 0) + times
+            stats.distractor_counts = merged
+            stats.refresh_rates()
+            rows.append(stats)
+        QuestionStats.objects.bulk_create(
+            rows, batch_size=batch_size, update_conflicts=True, unique_fields=['question'],
+            update_fields=COUNT_FIELDS + ['miss_rate', 'discrimination', 'distractor_counts',
+                                         'top_distractor_id', 'top_distractor_count', 'updated_at'],
+        )
+        ProcessingWatermark.advance(WATERMARK_NAME, end)
+
+    return {'results': result_count, 'questions': len(rows), 'watermark': end}
@@ -0,0 +1,56 @@
+# exam_app/answer_backfill.py
+"""
+Conversion of the comma-separated ExamResult.wrong_questions strings of older results into ExamAnswer rows.
+
+Used by migration 0008 (on upgrade) and by the backfill_exam_answers command (to run it again by hand).
+The models are passed in, so the migration can call it with its historical models.
+The old strings only list the wrong questions, so the correctly answered questions and the chosen answers
+of these results can't be recovered; the rows are marked backfilled=True and the item analysis skips them.
+"""
+
+# Number of ExamResult rows fetched from the database at a time
+CHUNK_SIZE = 2000
+
+
+def backfill_exam_answers(ExamResult, ExamAnswer, batch_size=1000):
+    """
+    Creates one ExamAnswer (is_correct=False, no chosen answer, backfilled=True) per missed question
+    of every official ExamResult that has no ExamAnswer rows yet. Must be called inside a transaction.
+    Input: ExamResult, ExamAnswer (the model classes), batch_size (ExamAnswer rows written per query)
+    Output: (converted results, created rows, skipped values that are not question IDs)
+    """
+    # Practice results never get ExamAnswer rows (see views.take_exam), they must not be backfilled either.
+    # mode='exam' instead of official(): historical models in migrations don't have the custom manager.
+    results = ExamResult.objects.filter(mode='exam', answers__isnull=True).order_by('id') \
+        .values_list('id', 'user_id', 'wrong_questions')
+
+    converted = created = skipped = 0
+    last_id = 0
+    while True:
+        # Each chunk is read completely before writing, because the query itself looks at
+        # the ExamAnswer table (answers__isnull) that is being filled.
+        chunk = list(results.filter(id__gt=last_id)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+
+        pending = []
+        for result_id, user_id, wrong_questions in chunk:
+            converted += 1
+            seen = set()
+            # IDs are stored as a string, split them by comma
+            for part in (wrong_questions or '').split(','):
+                try:
+                    question_id = int(part)
+                except ValueError:
+                    # Empty strings (no mistakes) or tampered values
+                    skipped += part.strip() != ''
+                    continue
+                if question_id in seen:
+                    continue
+                seen.add(question_id)
+                pending.append(ExamAnswer(result_id=result_id, user_id=user_id,
+                                          question_id=question_id, is_correct=False, backfilled=True))
+        ExamAnswer.objects.bulk_create(pending, batch_size=batch_size)
+        created += len(pending)
+    return converted, created, skipped
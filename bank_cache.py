@@ -0,0 +1,148 @@
+# exam_app/bank_cache.py
+"""
+Read-mostly cache of the question bank.
+
+The bank only changes when load_exam_data runs (or a question is edited in the Admin panel),
+but every exam page and every submission used to read Question and Choice again.
+Here the whole bank is loaded once into a compact QuestionBank object:
+- question texts and their choices as tuples (for exam.html),
+- the answer key {question_id: (correct choice ids)} (for grading),
+- an array of the active question IDs, and one per category (for sampling.py), per question bank
+  (Question.bank: a licence class or a language), so an exam is only drawn from one bank.
+
+Each worker keeps the object in memory and only asks the database for the bank version
+(QuestionBankVersion, one tiny query) every EXAM_BANK_VERSION_CHECK seconds.
+When the version changed, the new bank is taken from the Django cache named by
+EXAM_BANK_CACHE ('default' unless configured; local-memory, Redis, Memcached...),
+so with a shared backend only one worker builds it, and with the local-memory backend
+each worker builds it once.
+"""
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Question, Choice, QuestionBankVersion
+
+# Plain tuples pickle small and fast, which matters for shared cache backends.
+# The template reads q.id, q.text, q.choices and choice.id, choice.text, like on the model objects.
+CachedQuestion = namedtuple('CachedQuestion', ['id', 'text', 'choices'])
+CachedChoice = namedtuple('CachedChoice', ['id', 'text'])
+
+
+class QuestionBank:
+    """
+    Immutable snapshot of one question bank at one version.
+    Input: version, name (the Question.bank it draws from, '' for the default bank),
+    questions ({id: CachedQuestion}) and answer_key ({question_id: (correct choice ids)}) of all banks,
+    active_ids (array of the IDs of the bank's questions that can be asked), strata ({category: array of active IDs}).
+    Output: An object shared by all requests of a worker; it must not be modified.
+    The questions and the answer key cover every bank, so an exam can be shown and graded whichever bank
+    it was drawn from; only active_ids and strata (what new exams are drawn from) belong to the one bank.
+    """
+    __slots__ = ('version', 'name', 'questions', 'answer_key', 'active_ids', 'strata')
+
+    def __init__(self, version, name, questions, answer_key, active_ids, strata):
+        self.version = version
+        self.name = name
+        self.questions = questions
+        self.answer_key = answer_key
+        self.active_ids = active_ids
+        self.strata = strata
+
+    # __slots__ classes need these to be pickled by the cache backends
+    def __getstate__(self):
+        return (self.version, self.name, self.questions, self.answer_key, self.active_ids, self.strata)
+
+    def __setstate__(self, state):
+        self.version, self.name, self.questions, self.answer_key, self.active_ids, self.strata = state
+
+
+# Per-worker copy of the banks ({bank name: QuestionBank}), and when their version was last compared with the database
+_local = {'banks': None, 'checked_at': 0.0}
+_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'EXAM_BANK_CACHE', 'default')]
+
+
+def _cache_key(version):
+    return f"exam_bank:v{version}"
+
+
+def build_banks(version):
+    """
+    Reads all banks from the database (2 queries).
+    Input: version (the QuestionBankVersion the snapshot belongs to)
+    Output: A dict {bank name: QuestionBank}; the banks share one questions dict and one answer key.
+    """
+    choices_by_question = {}
+    answer_key = {}
+    rows = Choice.objects.order_by('id').values_list('id', 'question_id', 'text', 'is_correct')
+    for choice_id, question_id, text, is_correct in rows:
+        choices_by_question.setdefault(question_id, []).append(CachedChoice(choice_id, text))
+        if is_correct:
+            answer_key[question_id] = answer_key.get(question_id, ()) + (choice_id,)
+
+    # Retired questions stay in the snapshot, so an exam that is running during an import can still be shown and graded.
+    questions = {}
+    active_ids = {}  # {bank name: array of active IDs}
+    strata = {}  # {bank name: {category: array of active IDs}}
+    rows = Question.objects.order_by('id').values_list('id', 'text', 'is_active', 'category', 'bank')
+    for question_id, text, is_active, category, name in rows:
+        questions[question_id] = CachedQuestion(question_id, text, tuple(choices_by_question.get(question_id, ())))
+        if is_active:
+            active_ids.setdefault(name, array('q')).append(question_id)
+            strata.setdefault(name, {}).setdefault(category, array('q')).append(question_id)
+
+    # The default bank always exists, even when every question belongs to a named bank
+    active_ids.setdefault('', array('q'))
+    return {name: QuestionBank(version, name, questions, answer_key, ids, strata.get(name, {}))
+            for name, ids in active_ids.items()}
+
+
+def _get_banks():
+    # {bank name: QuestionBank} of the current version, loaded only when the version changed
+    now = time.monotonic()
+    banks = _local['banks']
+    if banks is not None and now - _local['checked_at'] < getattr(settings, 'EXAM_BANK_VERSION_CHECK', 5):
+        return banks
+
+    with _lock:
+        version = QuestionBankVersion.current()
+        banks = _local['banks']
+        if banks is None or banks[''].version != version:
+            cache = _cache()
+            banks = cache.get(_cache_key(version))
+            if banks is None:
+                banks = build_banks(version)
+                # Old versions are never read again; they expire instead of being deleted one by one.
+                cache.set(_cache_key(version), banks, timeout=getattr(settings, 'EXAM_BANK_CACHE_TIMEOUT', 24 * 60 * 60))
+            _local['banks'] = banks
+        _local['checked_at'] = now
+    return banks
+
+
+def get_bank(name=''):
+    """
+    Returns the current snapshot of a question bank, loading the banks only when their version changed.
+    Input: name (the Question.bank to draw exams from, '' for the default bank)
+    Output: A QuestionBank (shared, read only). The default bank always exists; for another name
+    None is returned if none of its questions is active.
+    """
+    return _get_banks().get(name)
+
+
+def invalidate_local():
+    """
+    Forgets this worker's copy, so the next get_bank() compares the version right away.
+    load_exam_data calls it after its transaction is committed.
+    Input: None
+    Output: None
+    """
+    _local['banks'] = None
+    _local['checked_at'] = 0.0
@@ -0,0 +1,204 @@
+# exam_app/bank_files.py
+"""
+Finding, parsing and validating question bank files for load_exam_data --banks.
+
+A bank is one directory in the data/ layout (a merged final_exam_data.csv, or a
+*questions*.csv / *answers*.csv pair) or a single merged CSV file. parse_bank() reads one bank
+completely and collects every problem instead of stopping at the first one, so the report
+lists all of them. It only uses the csv module (no pandas, no Django), so it can run on a
+process pool without setting anything up in the workers.
+"""
+import csv
+import glob
+import os
+
+MERGED_FILE = 'final_exam_data.csv'
+MERGED_COLUMNS = ['question_text', 'answer_text', 'is_correct']
+QUESTION_COLUMNS = ['question_id', 'question_text']
+ANSWER_COLUMNS = ['question_id', 'answer_text', 'is_correct']
+
+# Every problem is counted, but only this many are listed per bank in the report
+MAX_LISTED_ISSUES = 200
+
+# Question.bank max_length: longer names can't be stored
+MAX_BANK_NAME_LENGTH = 50
+
+
+def _bank_layout(directory):
+    # ('merged', path) / ('pair', questions path, answers path) for a bank directory, or None
+    merged = os.path.join(directory, MERGED_FILE)
+    if os.path.isfile(merged):
+        return ('merged', merged)
+    questions = sorted(glob.glob(os.path.join(directory, '*questions*.csv')))
+    answers = sorted(glob.glob(os.path.join(directory, '*answers*.csv')))
+    if len(questions) == 1 and len(answers) == 1:
+        return ('pair', questions[0], answers[0])
+    return None
+
+
+def find_banks(target, max_name_length=MAX_BANK_NAME_LENGTH):
+    """
+    Input: target (a directory of bank directories, a single bank directory, or a glob of bank directories / merged CSV files),
+    max_name_length (the longest bank name that can be stored)
+    Output: A list of (bank name, layout) tuples sorted by name; the name is the directory name or the CSV file name
+    without extension. Directories that don't look like a bank are returned with layout None, so they are reported;
+    hidden directories (.git, ...) are skipped.
+    Raises ValueError if a bank name is longer than max_name_length (rename the directory or file).
+    """
+    banks = _find_banks(target)
+    too_long = [name for name, _ in banks if len(name) > max_name_length]
+    if too_long:
+        raise ValueError(f"Bank names longer than {max_name_length} characters: {', '.join(too_long)}")
+    return banks
+
+
+def _find_banks(target):
+    # The (bank name, layout) tuples of find_banks, before the names are checked
+    if os.path.isdir(target):
+        layout = _bank_layout(target)
+        subdirectories = sorted(entry.path for entry in os.scandir(target)
+                                if entry.is_dir() and not entry.name.startswith('.'))
+        if layout is not None or not subdirectories:
+            # The directory itself is the bank (like data/)
+            return [(os.path.basename(os.path.normpath(target)), layout)]
+        # A directory of banks: every subdirectory is one, those without a valid layout get None and are reported
+        return [(os.path.basename(path), _bank_layout(path)) for path in subdirectories]
+
+    banks = []
+    for path in sorted(glob.glob(target)):
+        if os.path.isdir(path):
+            banks.append((os.path.basename(os.path.normpath(path)), _bank_layout(path)))
+        elif path.endswith('.csv'):
+            # banks/b1/final_exam_data.csv is the bank "b1", banks/b1.csv the bank "b1" too
+            if os.path.basename(path) == MERGED_FILE:
+                name = os.path.basename(os.path.dirname(os.path.abspath(path)))
+            else:
+                name = os.path.splitext(os.path.basename(path))[0]
+            banks.append((name, ('merged', path)))
+    return banks
+
+
+class _Report:
+    """
+    Collects the problems of one bank.
+    """
+    def __init__(self):
+        self.issues = []
+        self.counts = {}
+
+    def add(self, kind, file, line, detail, question=None):
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        if len(self.issues) < MAX_LISTED_ISSUES:
+            issue = {'type': kind, 'file': os.path.basename(file), 'line': line, 'detail': detail}
+            if question is not None:
+                issue['question'] = question[:120]
+            self.issues.append(issue)
+
+
+def _read_rows(path, columns, report):
+    """
+    Input: path (semicolon separated CSV), columns (required columns), report (_Report)
+    Output: A generator of (line number, {column: value}) for the rows with the right number of fields.
+    Rows with too many or too few fields (usually an unquoted ';' in a text) are reported as delimiter errors.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f, delimiter=';')
+        header = next(reader, None)
+        if header is None:
+            report.add('empty_file', path, 1, "The file is empty")
+            return
+        # lstrip removes a byte order mark written by Excel
+        header = [name.strip().lstrip('\ufeff') for name in header]
+        missing = [name for name in columns if name not in header]
+        if missing:
+            if len(header) == 1 and (',' in header[0] or '\t' in header[0]):
+                report.add('delimiter', path, 1, "The header is not separated by ';' (comma or tab separated file?)")
+            else:
+                report.add('missing_columns', path, 1, f"Missing columns: {', '.join(missing)}")
+            return
+        positions = [header.index(name) for name in columns]
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != len(header):
+                report.add('delimiter', path, reader.line_num,
+                           f"{len(row)} fields instead of {len(header)}; quote texts that contain ';'")
+                continue
+            yield reader.line_num, {name: row[position] for name, position in zip(columns, positions)}
+
+
+def _merged_rows(layout, report):
+    # (file, line, question text, answer text, is_correct text) for either layout
+    if layout[0] == 'merged':
+        path = layout[1]
+        for line, row in _read_rows(path, MERGED_COLUMNS, report):
+            yield path, line, row['question_text'], row['answer_text'], row['is_correct']
+        return
+
+    _, questions_path, answers_path = layout
+    lookup = {}
+    for line, row in _read_rows(questions_path, QUESTION_COLUMNS, report):
+        lookup[row['question_id'].strip()] = row['question_text']
+    for line, row in _read_rows(answers_path, ANSWER_COLUMNS, report):
+        question_text = lookup.get(row['question_id'].strip())
+        if question_text is None:
+            report.add('unknown_question', answers_path, line, f"No question with question_id {row['question_id']!r}")
+            continue
+        yield answers_path, line, question_text, row['answer_text'], row['is_correct']
+
+
+def parse_bank(bank, layout, answer_max_length=300):
+    """
+    Reads and validates one bank (runs in a worker process).
+    Input: bank (its name), layout (from find_banks), answer_max_length (Choice.text max_length).
+    Output: A dict with 'bank', 'source', 'questions' ([(question_text, [(answer_text, is_correct), ...]), ...] in file order),
+    'rows', 'issues' (the first MAX_LISTED_ISSUES problems) and 'issue_counts' ({type: number}).
+    Problem types: empty_file, missing_columns, delimiter, unknown_question, empty_text, invalid_is_correct,
+    answer_too_long, duplicate_answer, duplicate_question, correct_count (not exactly one correct answer).
+    """
+    report = _Report()
+    result = {'bank': bank, 'source': None, 'questions': [], 'rows': 0}
+    if layout is None:
+        report.add('layout', bank, 0, f"No {MERGED_FILE} and no single *questions*.csv / *answers*.csv pair")
+        return dict(result, issues=report.issues, issue_counts=report.counts)
+    result['source'] = ' + '.join(layout[1:])
+
+    groups = {}  # {question text: [(answer text, is_correct), ...]}, in file order
+    first_line = {}  # {question text: (file, line of its first answer)}
+    previous = None
+    try:
+        for path, line, q_text, a_text, is_correct in _merged_rows(layout, report):
+            q_text, a_text = q_text.strip(), a_text.strip()
+            if not q_text or not a_text:
+                report.add('empty_text', path, line, "Empty question or answer text", q_text or None)
+                continue
+            if is_correct.strip() not in ('0', '1'):
+                report.add('invalid_is_correct', path, line, f"is_correct must be 0 or 1, got {is_correct!r}", q_text)
+                continue
+            if len(a_text) > answer_max_length:
+                report.add('answer_too_long', path, line,
+                           f"Answer has {len(a_text)} characters, at most {answer_max_length} fit", q_text)
+            if q_text != previous and q_text in groups:
+                # The same text again after other questions: a duplicate question (or answers split over the file)
+                report.add('duplicate_question', path, line,
+                           f"Same question text as on line {first_line[q_text][1]}", q_text)
+            answers = groups.setdefault(q_text, [])
+            first_line.setdefault(q_text, (path, line))
+            if any(text == a_text for text, _ in answers):
+                report.add('duplicate_answer', path, line, "The same answer twice for this question", q_text)
+            else:
+                answers.append((a_text, is_correct.strip() == '1'))
+                # Only the rows that are imported are counted
+                result['rows'] += 1
+            previous = q_text
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        report.add('unreadable', bank, 0, str(e))
+
+    for q_text, answers in groups.items():
+        correct = sum(1 for _, is_correct in answers if is_correct)
+        if correct != 1:
+            path, line = first_line[q_text]
+            report.add('correct_count', path, line, f"{correct} correct answers instead of exactly one", q_text)
+
+    result['questions'] = list(groups.items())
+    return dict(result, issues=report.issues, issue_counts=report.counts)
@@ -0,0 +1,130 @@
+# exam_app/charts.py
+"""
+Statistics charts, rendered outside of the page request and cached as PNG bytes.
+
+A chart only changes when the user finishes another exam, so every rendered PNG is stored in the
+Django cache under (user, chart type, ID of the user's latest ExamResult). A new result gives a
+new key; the old images simply expire. The drawing itself lives in plotting.py, which is only
+imported on a cache miss: matplotlib (tens of MB, hundreds of ms to import) is not loaded by
+workers that never draw a chart, e.g. the ones only serving take_exam.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.utils import timezone
+
+from .models import ExamResult, UserExamStats
+
+logger = logging.getLogger(__name__)
+
+# The chart types offered on the statistics page; 'pie' is the default
+CHART_TYPES = ('pie', 'line', 'histogram')
+DEFAULT_CHART_TYPE = 'pie'
+
+# Small pool shared by the worker process, created on first use
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'EXAM_CHART_CACHE', 'default')]
+
+
+def chart_cache_key(user_id, chart_type, latest_result_id):
+    return f"exam_chart:{user_id}:{chart_type}:{latest_result_id}"
+
+
+def latest_result(user_id):
+    """
+    Input: user_id
+    Output: (id, date_taken) of the user's most recent official ExamResult, or None if they have no results.
+    """
+    return ExamResult.objects.official().filter(user_id=user_id).order_by('-id').values_list('id', 'date_taken').first()
+
+
+def get_user_chart(user_id, chart_type, latest_result_id):
+    """
+    Returns a user's chart from the cache, rendering and storing it on a miss.
+    Input: user_id, chart_type (one of CHART_TYPES), latest_result_id (ID of the user's latest ExamResult).
+    Output: PNG bytes.
+    """
+    cache = _cache()
+    key = chart_cache_key(user_id, chart_type, latest_result_id)
+    png = cache.get(key)
+    if png is None:
+        rows = list(ExamResult.objects.official().filter(user_id=user_id, id__lte=latest_result_id)
+                    .order_by('date_taken').values_list('score', 'passed'))
+        scores = [score for score, _ in rows]
+        passed_count = sum(1 for _, passed in rows if passed)
+        # Imported here, not at the top: loads matplotlib on the first chart that is actually drawn
+        from .plotting import render_chart
+        png = render_chart(chart_type, scores, passed_count)
+        cache.set(key, png, timeout=getattr(settings, 'EXAM_CHART_CACHE_TIMEOUT', 7 * 24 * 60 * 60))
+    return png
+
+
+def _prerender(user_id, latest_result_id):
+    try:
+        for chart_type in CHART_TYPES:
+            get_user_chart(user_id, chart_type, latest_result_id)
+    except Exception:
+        # A failed pre-render only means the chart is drawn on the first page view instead
+        logger.exception("Pre-rendering the charts of user %s failed", user_id)
+    finally:
+        # The thread opened its own database connection; don't leave it open
+        connections.close_all()
+
+
+def schedule_prerender(user_id, latest_result_id):
+    """
+    Renders all chart types of a user in the background, e.g. right after an exam was submitted,
+    so the statistics page finds them in the cache. Does nothing unless EXAM_CHART_PRERENDER is True.
+    Input: user_id, latest_result_id (ID of the ExamResult that was just created).
+    Output: None
+    """
+    global _executor
+    if not getattr(settings, 'EXAM_CHART_PRERENDER', False):
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'EXAM_CHART_WORKERS', 2),
+                                           thread_name_prefix='exam-charts')
+    _executor.submit(_prerender, user_id, latest_result_id)
+
+
+# The charts of the cohort dashboard
+COHORT_CHART_TYPES = ('pass_rate', 'distribution')
+
+
+def get_cohort_chart(chart_type, period, since, watermark):
+    """
+    Returns a cohort dashboard chart from the cache, rendering and storing it on a miss.
+    Like the user charts, the key includes what the chart is drawn from: the rollups change only when
+    build_rollups moves its watermark, so a new watermark (or a new first day) gives a new key.
+    Input: chart_type (one of COHORT_CHART_TYPES), period ('hour' or 'day'), since (start of the first period),
+    watermark (the last ExamResult ID in the rollups).
+    Output: PNG bytes.
+    """
+    from . import rollups  # Only the dashboard needs it
+
+    cache = _cache()
+    key = f"exam_cohort_chart:{chart_type}:{period}:{since:%Y%m%d%H}:{watermark}"
+    png = cache.get(key)
+    if png is None:
+        rows = rollups.series(period, since)
+        if chart_type == 'distribution':
+            labels, values = list(range(UserExamStats.HISTOGRAM_SIZE)), rollups.distribution(rows)
+        else:
+            label_format = '%m-%d' if period == 'day' else '%m-%d %H:00'
+            labels = [timezone.localtime(row.period_start).strftime(label_format) if timezone.is_aware(row.period_start)
+                      else row.period_start.strftime(label_format) for row in rows]
+            values = [row.pass_rate for row in rows]
+        # Imported here, not at the top: loads matplotlib on the first chart that is actually drawn
+        from .plotting import render_cohort_chart
+        png = render_cohort_chart(chart_type, labels, values)
+        cache.set(key, png, timeout=getattr(settings, 'EXAM_CHART_CACHE_TIMEOUT', 7 * 24 * 60 * 60))
+    return png
@@ -0,0 +1,205 @@
+# exam_app/exports.py
+"""
+Streaming performance-report exports.
+
+The reports cover the official exams (not the practice exams) and are produced by generators and sent with StreamingHttpResponse: the ExamResult
+rows are read with .iterator() in chunks of EXPORT_CHUNK_SIZE and every line is written
+to the client as soon as it is built, so memory stays flat however long the history is.
+The summary numbers come from UserExamStats (see models.py) instead of recomputing them;
+the all-users export fetches them for STATS_CHUNK_SIZE users at a time.
+"""
+import csv
+import json
+
+from .models import ExamResult, UserExamStats
+
+# Number of ExamResult rows fetched from the database at a time
+EXPORT_CHUNK_SIZE = 2000
+
+# Number of users whose UserExamStats are fetched with one query by the all-users export
+STATS_CHUNK_SIZE = 500
+
+# Supported formats: (content type, file extension)
+EXPORT_FORMATS = {
+    'txt': ('text/plain', 'txt'),
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+CSV_COLUMNS = ['username', 'result_id', 'date_taken', 'score', 'passed']
+
+
+class _Echo:
+    """
+    File-like object whose write() returns the value instead of storing it,
+    so csv.writer can format one row at a time for a generator.
+    """
+    def write(self, value):
+        return value
+
+
+def _consistency(std_dev):
+    # Consistency Level based on Standard Deviation (same thresholds as the statistics page)
+    return "High" if std_dev < 2 else "Medium" if std_dev < 4 else "Low"
+
+
+def _values(results):
+    return results.values_list('id', 'user_id', 'user__username', 'date_taken', 'score', 'passed') \
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _user_results(user_id, after=None, limit=None):
+    """
+    Input: user_id, after (optional ExamResult id to continue after), limit (optional maximum number of rows).
+    Output: An iterator of (id, user_id, username, date_taken, score, passed) tuples in the order the exams were taken.
+    """
+    results = ExamResult.objects.official().filter(user_id=user_id).order_by('id')
+    if after is not None:
+        # Keyset pagination: continue after the last result of the previous page
+        results = results.filter(id__gt=after)
+    if limit is not None:
+        results = results[:limit]
+    return _values(results)
+
+
+def _all_results(after_user=None, user_limit=None):
+    """
+    Input: after_user (optional user ID to continue after), user_limit (optional maximum number of users).
+    Output: An iterator of (id, user_id, username, date_taken, score, passed) tuples, user by user.
+    """
+    results = ExamResult.objects.official().order_by('user_id', 'id')
+    if after_user is not None:
+        # Keyset pagination over the users, so a user's history is never cut in two
+        results = results.filter(user_id__gt=after_user)
+    if user_limit is not None:
+        page_users = list(results.order_by('user_id').values_list('user_id', flat=True).distinct()[:user_limit])
+        if not page_users:
+            return iter(())
+        results = results.filter(user_id__lte=page_users[-1])
+    return _values(results)
+
+
+def _user_chunks(after_user=None, user_limit=None, chunk_size=STATS_CHUNK_SIZE):
+    """
+    Input: after_user, user_limit (optional keyset pagination over the user IDs, see _all_results), chunk_size.
+    Output: A generator of lists of up to chunk_size IDs of users with results, in user ID order.
+    """
+    last_user = after_user
+    remaining = user_limit
+    while remaining is None or remaining > 0:
+        users = ExamResult.objects.official().order_by('user_id').values_list('user_id', flat=True).distinct()
+        if last_user is not None:
+            users = users.filter(user_id__gt=last_user)
+        chunk = list(users[:chunk_size if remaining is None else min(chunk_size, remaining)])
+        if not chunk:
+            return
+        yield chunk
+        last_user = chunk[-1]
+        if remaining is not None:
+            remaining -= len(chunk)
+
+
+def _text_header(username, stats):
+    # First part of the report with the # of exams taken, average, standard deviation, success rate, consistency
+    return "\n".join([
+        f"EXAM PERFORMANCE REPORT - {username.upper()}",
+        "=" * 45, # separators
+        f"Total Exams Taken: {stats.exam_count}",
+        f"Average Score:     {stats.mean:.2f} / 20", # .2f => float with 2 decimal points
+        f"Standard Deviation: {stats.std_dev:.2f}", # .2f => float with 2 decimal points
+        f"Success Rate:      %{stats.success_rate:.1f}", # .1f => float with 1 decimal point
+        f"Consistency Level: {_consistency(stats.std_dev)}",
+        "-" * 45, # separators
+        "\nDETAILED EXAM HISTORY:" # Title of the second part of the exam
+    ])
+
+
+def _text_entry(date_taken, score, passed):
+    # strftime to convert into %Y-%m-%d format
+    return f"\n- Date: {date_taken.strftime('%Y-%m-%d')} | Score: {score}/20 | Status: {'Passed' if passed else 'Failed'}"
+
+
+def _text_footer():
+    return "\n" + "\n" + "=" * 45 + "\nEND OF REPORT"
+
+
+def _summary(stats):
+    return {
+        'total_exams': stats.exam_count,
+        'average_score': round(stats.mean, 4),
+        'std_dev': round(stats.std_dev, 4),
+        'max_score': stats.max_score,
+        'success_rate': round(stats.success_rate, 4),
+        'consistency': _consistency(stats.std_dev),
+    }
+
+
+def iter_user_report(user, stats, fmt='txt', after=None, limit=None):
+    """
+    Streams one user's performance report.
+    Input: user, stats (the user's UserExamStats), fmt ('txt', 'csv' or 'jsonl'),
+    after/limit (optional keyset pagination over the result IDs; the summary is only sent on the first page).
+    Output: A generator of text chunks. The 'txt' format is the same report the statistics page always offered.
+    """
+    rows = _user_results(user.id, after, limit)
+    first_page = after is None
+
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(CSV_COLUMNS)
+        for result_id, _, username, date_taken, score, passed in rows:
+            yield writer.writerow([username, result_id, date_taken.isoformat(), score, int(passed)])
+
+    elif fmt == 'jsonl':
+        if first_page:
+            yield json.dumps({'type': 'summary', 'username': user.username, **_summary(stats)}) + "\n"
+        for result_id, _, username, date_taken, score, passed in rows:
+            yield json.dumps({'type': 'result', 'username': username, 'result_id': result_id,
+                              'date_taken': date_taken.isoformat(), 'score': score, 'passed': passed}) + "\n"
+
+    else:
+        if first_page:
+            yield _text_header(user.username, stats)
+        for _, _, _, date_taken, score, passed in rows:
+            yield _text_entry(date_taken, score, passed)
+        yield _text_footer()
+
+
+def iter_all_reports(fmt='txt', after_user=None, user_limit=None):
+    """
+    Streams the reports of all users in one file (for administrators).
+    Input: fmt ('txt', 'csv' or 'jsonl'), after_user/user_limit (optional keyset pagination over the user IDs).
+    Output: A generator of text chunks; the users follow each other in user ID order.
+    """
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(CSV_COLUMNS)
+        for result_id, _, username, date_taken, score, passed in _all_results(after_user, user_limit):
+            yield writer.writerow([username, result_id, date_taken.isoformat(), score, int(passed)])
+        return
+
+    # txt and jsonl start every user with a summary. The users are read in chunks of STATS_CHUNK_SIZE:
+    # one query for the UserExamStats of the whole chunk, then the chunk's results are streamed.
+    current_user = None
+    for users in _user_chunks(after_user, user_limit):
+        stats_by_user = {stats.user_id: stats for stats in UserExamStats.objects.filter(user_id__in=users)}
+        rows = _values(ExamResult.objects.official().filter(user_id__in=users).order_by('user_id', 'id'))
+        for result_id, user_id, username, date_taken, score, passed in rows:
+            if user_id != current_user:
+                # Users without totals (results from before the table existed) are computed, not saved:
+                # a download must not write to the database in the middle of the response
+                stats = stats_by_user.get(user_id) or UserExamStats.from_history(user_id)
+                if fmt == 'jsonl':
+                    yield json.dumps({'type': 'summary', 'username': username, **_summary(stats)}) + "\n"
+                else:
+                    if current_user is not None:
+                        yield _text_footer() + "\n\n"
+                    yield _text_header(username, stats)
+                current_user = user_id
+            if fmt == 'jsonl':
+                yield json.dumps({'type': 'result', 'username': username, 'result_id': result_id,
+                                  'date_taken': date_taken.isoformat(), 'score': score, 'passed': passed}) + "\n"
+            else:
+                yield _text_entry(date_taken, score, passed)
+    if fmt == 'txt' and current_user is not None:
+        yield _text_footer()
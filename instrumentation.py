@@ -0,0 +1,213 @@
+# exam_app/instrumentation.py
+"""
+Lightweight per-request timing of the exam views.
+
+ExamTimingMiddleware measures every request: the number and duration of its SQL queries,
+the total time, and the named spans the views open with `with span("grading"):`.
+The measurements are sent to the browser as a Server-Timing header (visible in the
+developer tools) and handed to a pluggable sink: the log, or an in-process rolling
+histogram that administrators read from timing_stats_view.
+
+Settings:
+    EXAM_TIMING_ENABLED  - False by default. When off, the middleware removes itself at startup
+                           (MiddlewareNotUsed) and span() costs one ContextVar lookup.
+    EXAM_TIMING_SINK     - dotted path of the sink class,
+                           'exam_app.instrumentation.RollingHistogramSink' by default.
+    EXAM_TIMING_WINDOW   - number of recent requests kept per metric by the rolling histogram (default 1000).
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Name under which requests that don't match any URL are recorded
+UNRESOLVED_VIEW = '<unresolved>'
+
+# The timings of the request being handled in this thread / task, or None when timing is off
+_current = contextvars.ContextVar('exam_request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Measurements of one request.
+    Input: filled by ExamTimingMiddleware (queries) and span() (named phases).
+    Output: spans ({name: milliseconds}), query_count, query_ms.
+    """
+    __slots__ = ('spans', 'query_count', 'query_ms')
+
+    def __init__(self):
+        self.spans = {}
+        self.query_count = 0
+        self.query_ms = 0.0
+
+    def add(self, name, ms):
+        # A span that runs more than once in a request (e.g. in a loop) is summed up
+        self.spans[name] = self.spans.get(name, 0.0) + ms
+
+
+class _Span:
+    __slots__ = ('timings', 'name', 'started')
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.add(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """
+    Times a named phase of the current request.
+    Input: name (e.g. "sampling", "grading"; letters, digits and _ only, it is used in the Server-Timing header)
+    Output: A context manager. Outside of a timed request it is a shared no-op object.
+    """
+    timings = _current.get()
+    if timings is None:
+        return _NO_SPAN
+    return _Span(timings, name)
+
+
+class LogSink:
+    """
+    Writes one log line per request to the 'exam_app.instrumentation' logger.
+    """
+    def record(self, view_name, total_ms, timings):
+        spans = " ".join(f"{name}={ms:.1f}ms" for name, ms in timings.spans.items())
+        logger.info("%s total=%.1fms db=%.1fms queries=%d %s",
+                    view_name, total_ms, timings.query_ms, timings.query_count, spans)
+
+
+class RollingHistogramSink:
+    """
+    Keeps the last EXAM_TIMING_WINDOW values of every metric of every view in memory (per worker process),
+    and summarises them as count / p50 / p95 / max for timing_stats_view.
+    """
+    def __init__(self):
+        self.window = getattr(settings, 'EXAM_TIMING_WINDOW', 1000)
+        self._values = {}  # {(view name, metric): deque of values}
+        self._lock = threading.Lock()
+
+    def _add(self, key, value):
+        values = self._values.get(key)
+        if values is None:
+            values = self._values[key] = deque(maxlen=self.window)
+        values.append(value)
+
+    def record(self, view_name, total_ms, timings):
+        with self._lock:
+            self._add((view_name, 'total_ms'), total_ms)
+            self._add((view_name, 'db_ms'), timings.query_ms)
+            self._add((view_name, 'queries'), timings.query_count)
+            for name, ms in timings.spans.items():
+                self._add((view_name, f"{name}_ms"), ms)
+
+    def summary(self):
+        """
+        Input: None
+        Output: {view name: {metric: {'count', 'p50', 'p95', 'max'}}}
+        """
+        with self._lock:
+            snapshot = {key: sorted(values) for key, values in self._values.items()}
+        result = {}
+        for (view_name, metric), values in sorted(snapshot.items()):
+            result.setdefault(view_name, {})[metric] = {
+                'count': len(values),
+                'p50': round(values[int(0.50 * (len(values) - 1))], 3),
+                'p95': round(values[int(0.95 * (len(values) - 1))], 3),
+                'max': round(values[-1], 3),
+            }
+        return result
+
+
+# The sink of this worker process, created by the middleware
+_sink = None
+
+
+def get_sink():
+    """
+    Input: None
+    Output: The configured sink (created on first use), shared by all requests of the process.
+    """
+    global _sink
+    if _sink is None:
+        _sink = import_string(getattr(settings, 'EXAM_TIMING_SINK', 'exam_app.instrumentation.RollingHistogramSink'))()
+    return _sink
+
+
+class ExamTimingMiddleware:
+    """
+    Times every request (add 'exam_app.instrumentation.ExamTimingMiddleware' to MIDDLEWARE).
+    Input: the request
+    Output: the response with a Server-Timing header, e.g.
+        Server-Timing: db;dur=3.1;desc="4 queries", sampling;dur=0.1, render;dur=6.0, total;dur=11.4
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'EXAM_TIMING_ENABLED', False):
+            # Django drops the middleware from the chain: no cost at all when timing is off
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sink = get_sink()
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(self._time_query(timings)):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        parts = [f'db;dur={timings.query_ms:.1f};desc="{timings.query_count} queries"']
+        parts += [f"{name};dur={ms:.1f}" for name, ms in timings.spans.items()]
+        parts.append(f"total;dur={total_ms:.1f}")
+        response['Server-Timing'] = ", ".join(parts)
+
+        match = getattr(request, 'resolver_match', None)
+        # 404s and probes share one bucket: one key per unknown path would grow the sink without limit
+        view_name = (match.url_name or match.view_name) if match else UNRESOLVED_VIEW
+        try:
+            self.sink.record(view_name, total_ms, timings)
+        except Exception:
+            # Measuring must never break the page
+            logger.exception("Recording the request timings failed")
+        return response
+
+    @staticmethod
+    def _time_query(timings):
+        def wrapper(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                timings.query_count += 1
+                timings.query_ms += (time.perf_counter() - started) * 1000
+        return wrapper
@@ -0,0 +1,45 @@
+import time
+from django.core.management.base import BaseCommand
+from exam_app.analytics import CHUNK_SIZE, refresh_question_stats
+from exam_app.models import QuestionStats
+
+class Command(BaseCommand):
+    """
+    Custom Django Management Command to update the item analysis of every question (QuestionStats):
+    miss rate, discrimination (passed vs. failed candidates) and the most picked wrong answer.
+    Usage: python manage.py analyze_items [--full] [--chunk-size 2000] [--top 10]
+    Input: The ExamAnswer rows of the exams taken since the last run (see analytics.py).
+    Output: Updated QuestionStats rows, and the hardest and the least discriminating questions printed.
+    """
+    help = 'Updates the per-question difficulty statistics from the graded exam answers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Recompute from the whole history instead of only the new exams")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help=f"Exam results read per query (default: {CHUNK_SIZE})")
+        parser.add_argument('--top', type=int, default=10, help="Number of questions listed (default: 10)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            summary = refresh_question_stats(full=options['full'], chunk_size=options['chunk_size'])
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Error while updating the question statistics: {e}"))
+            return
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {summary['results']} new exam results and updated {summary['questions']} questions "
+            f"in {elapsed:.2f} s (processed up to result {summary['watermark']})."
+        ))
+
+        top = options['top']
+        self.stdout.write("\nMost missed questions:")
+        for stats in QuestionStats.objects.order_by('-miss_rate', 'question_id')[:top]:
+            self.stdout.write(f"  #{stats.question_id:<8} miss rate {stats.miss_rate:6.1%}  ({stats.attempts} answers)")
+
+        self.stdout.write("\nLeast discriminating questions:")
+        for stats in QuestionStats.objects.filter(discrimination__isnull=False).order_by('discrimination', 'question_id')[:top]:
+            self.stdout.write(f"  #{stats.question_id:<8} discrimination {stats.discrimination:+.2f}  "
+                              f"top distractor {stats.top_distractor_id} ({stats.top_distractor_count}x)")
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from exam_app.answer_backfill import backfill_exam_answers
+from exam_app.models import ExamResult, ExamAnswer
+
+class Command(BaseCommand):
+    """
+    Custom Django Management Command to convert the comma-separated ExamResult.wrong_questions strings
+    of older results into ExamAnswer rows. Migration 0008 already does this on upgrade; the command
+    converts results restored or imported later.
+    Usage: python manage.py backfill_exam_answers [--batch-size 1000]
+    Input: Every ExamResult that has no ExamAnswer rows yet.
+    Output: One ExamAnswer (is_correct=False, no chosen answer, backfilled=True) per missed question of those results
+    (see answer_backfill.py).
+    """
+    help = 'Creates ExamAnswer rows from the wrong_questions strings of older exam results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of ExamAnswer rows written per query (default: 1000)")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                converted, created, skipped = backfill_exam_answers(ExamResult, ExamAnswer, options['batch_size'])
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Error while saving to database: {e}"))
+            return
+
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"Skipped {skipped} values that are not question IDs."))
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully converted {converted} exam results into {created} answer rows!"
+        ))
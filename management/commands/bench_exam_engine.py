@@ -0,0 +1,296 @@
+import csv
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import django
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from exam_app.bank_cache import invalidate_local
+from exam_app.models import Question, Choice, ExamResult, QuestionBankVersion
+from exam_app.sampling import EXAM_QUESTION_COUNT
+
+# Rows per INSERT while generating the synthetic data
+GENERATE_BATCH = 5000
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def read_shape(path):
+    """
+    Measures the shape of a real merged bank, so the synthetic one looks like it.
+    Input: path (a merged CSV like data/final_exam_data.csv)
+    Output: A dict with the answers-per-question counts and the average question/answer text lengths.
+    """
+    answers_per_question = {}
+    question_lengths, answer_lengths = [], []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f, delimiter=';'):
+            if row['question_text'] not in answers_per_question:
+                question_lengths.append(len(row['question_text']))
+            answers_per_question[row['question_text']] = answers_per_question.get(row['question_text'], 0) + 1
+            answer_lengths.append(len(row['answer_text']))
+    if not answers_per_question:
+        raise CommandError(f"{path} has no rows")
+    return {
+        'answers_per_question': list(answers_per_question.values()),
+        'question_length': round(statistics.mean(question_lengths)),
+        'answer_length': round(statistics.mean(answer_lengths)),
+    }
+
+
+def synthetic_text(rng, prefix, length):
+    # Readable filler with roughly the length of the real texts
+    words = ' '.join(f"w{rng.randrange(10000)}" for _ in range(max(1, length // 6)))
+    return f"{prefix} {words}"[:length]
+
+
+class Command(BaseCommand):
+    """
+    Custom Django Management Command that benchmarks the exam engine on a throwaway SQLite test database.
+    Usage: python manage.py bench_exam_engine [--questions 1000] [--results 10000] [--users 20]
+           [--requests 100] [--output bench_results.json] [--compare previous.json]
+    Input: The shape of data/final_exam_data.csv (answers per question, text lengths), which is scaled up
+    to a synthetic bank (10^3 .. 10^6 questions) and exam history.
+    Output: Latency percentiles, queries per request and peak Python memory of take_exam (GET/POST),
+    user_statistics_view, the chart and report downloads, and of load_exam_data, printed and written as JSON.
+    The real database is never touched: a test database is created and destroyed like in the test runner.
+    """
+    help = 'Benchmarks the exam views and the CSV import against synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=1000, help="Size of the synthetic bank (default: 1000)")
+        parser.add_argument('--results', type=int, default=10000, help="Number of ExamResult rows (default: 10000)")
+        parser.add_argument('--users', type=int, default=20, help="Number of users sharing the results (default: 20)")
+        parser.add_argument('--requests', type=int, default=100, help="Timed requests per endpoint (default: 100)")
+        parser.add_argument('--memory-requests', type=int, default=5,
+                            help="Requests per endpoint measured with tracemalloc (default: 5)")
+        parser.add_argument('--shape', default=os.path.join('data', 'final_exam_data.csv'),
+                            help="Merged CSV whose shape the synthetic bank copies (default: data/final_exam_data.csv)")
+        parser.add_argument('--seed', type=int, default=42, help="Random seed of the synthetic data (default: 42)")
+        parser.add_argument('--output', default='bench_results.json', help="Where to write the JSON results")
+        parser.add_argument('--compare', help="Earlier JSON results to compare the p50/p95 latencies with")
+
+    def handle(self, *args, **options):
+        shape = read_shape(options['shape'])
+        rng = random.Random(options['seed'])
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            report = self.run_benchmarks(options, shape, rng)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            self.compare(report, options['compare'])
+
+    # --- 1. SYNTHETIC DATA ---
+    def generate_bank(self, count, shape, rng):
+        questions = []
+        for n in range(count):
+            text = f"Q{n} " + synthetic_text(rng, "", shape['question_length'])
+            questions.append(Question(text=text, content_hash=Question.make_key(text)))
+        Question.objects.bulk_create(questions, batch_size=GENERATE_BATCH)
+
+        choices = []
+        for question_id in list(Question.objects.values_list('id', flat=True)):
+            answers = rng.choice(shape['answers_per_question'])
+            correct = rng.randrange(answers)
+            for a in range(answers):
+                choices.append(Choice(question_id=question_id, is_correct=(a == correct),
+                                      text=synthetic_text(rng, f"A{a}", shape['answer_length'])))
+            if len(choices) >= GENERATE_BATCH:
+                Choice.objects.bulk_create(choices)
+                choices = []
+        Choice.objects.bulk_create(choices)
+        QuestionBankVersion.bump()
+        invalidate_local()
+
+    def generate_history(self, users, count, rng):
+        question_ids = list(Question.objects.values_list('id', flat=True))
+        start = timezone.now() - datetime.timedelta(days=365)
+        for offset in range(0, count, GENERATE_BATCH):
+            results = []
+            for n in range(offset, min(count, offset + GENERATE_BATCH)):
+                score = min(20, max(0, round(rng.gauss(15, 3))))
+                wrong = rng.sample(question_ids, min(len(question_ids), 20 - score))
+                results.append(ExamResult(user=users[n % len(users)], score=score, passed=score >= 16,
+                                          wrong_questions=",".join(map(str, wrong))))
+            created = ExamResult.objects.bulk_create(results)
+            # auto_now_add ignores given values, so the history is spread over a year afterwards
+            for n, result in enumerate(created, start=offset):
+                result.date_taken = start + datetime.timedelta(minutes=n * 525600 // max(1, count))
+            ExamResult.objects.bulk_update(created, ['date_taken'])
+        # The totals and answer rows are built the same way as in production
+        call_command('rebuild_exam_stats', stdout=io.StringIO())
+        call_command('backfill_exam_answers', stdout=io.StringIO())
+
+    # --- 2. MEASUREMENTS ---
+    def measure(self, name, make_request, options):
+        """
+        Input: name, make_request (callable doing one request and returning the response), options.
+        Output: A dict with latency percentiles (ms), queries per request and peak memory (KiB).
+        """
+        latencies, queries = [], []
+        for _ in range(options['requests']):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = make_request()
+                # Streaming responses are only produced while they are read
+                if getattr(response, 'streaming', False):
+                    for _ in response.streaming_content:
+                        pass
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured.captured_queries))
+            if response.status_code >= 400:
+                raise CommandError(f"{name} answered {response.status_code}")
+
+        # Memory is measured in a separate, shorter pass: tracemalloc slows every allocation down
+        peaks = []
+        tracemalloc.start()
+        try:
+            for _ in range(options['memory_requests']):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                response = make_request()
+                if getattr(response, 'streaming', False):
+                    for _ in response.streaming_content:
+                        pass
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+
+        latencies.sort()
+        result = {
+            'requests': len(latencies),
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+            'queries_per_request': round(statistics.mean(queries), 2) if queries else 0,
+            'peak_memory_kib': round(max(peaks) / 1024, 1) if peaks else 0.0,
+        }
+        self.stdout.write(
+            f"{name:<28} p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+            f"p99 {result['p99_ms']:>9.2f} ms  {result['queries_per_request']:>6} queries  "
+            f"{result['peak_memory_kib']:>9.1f} KiB"
+        )
+        return result
+
+    def measure_import(self, questions, shape, rng):
+        """
+        Times load_exam_data on a synthetic merged CSV: a full --replace load, then a sync without changes.
+        Output: A dict with the seconds and rows per second of both runs.
+        """
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        rows = 0
+        try:
+            with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f, delimiter=';')
+                writer.writerow(['question_text', 'answer_text', 'is_correct'])
+                for n in range(questions):
+                    q_text = f"Import Q{n} " + synthetic_text(rng, "", shape['question_length'])
+                    answers = rng.choice(shape['answers_per_question'])
+                    correct = rng.randrange(answers)
+                    for a in range(answers):
+                        writer.writerow([q_text, synthetic_text(rng, f"A{a}", shape['answer_length']), int(a == correct)])
+                        rows += 1
+
+            timings = {}
+            for name, extra in (('replace', {'replace': True}), ('sync_unchanged', {})):
+                started = time.perf_counter()
+                call_command('load_exam_data', file=path, stdout=io.StringIO(), **extra)
+                elapsed = time.perf_counter() - started
+                timings[name] = {'seconds': round(elapsed, 3), 'rows_per_second': round(rows / elapsed) if elapsed else None}
+                self.stdout.write(f"load_exam_data {name:<14} {elapsed:>9.2f} s  {timings[name]['rows_per_second']} rows/s")
+            timings['rows'] = rows
+            return timings
+        finally:
+            os.remove(path)
+
+    def run_benchmarks(self, options, shape, rng):
+        self.stdout.write(f"Generating {options['questions']} questions and {options['results']} results...")
+        self.generate_bank(options['questions'], shape, rng)
+        users = [User.objects.create_user(f"bench{n}", password=None) for n in range(max(1, options['users']))]
+        self.generate_history(users, options['results'], rng)
+
+        client = Client()
+        client.force_login(users[0])
+        exam_url, stats_url = reverse('take_exam'), reverse('user_stats')
+
+        def new_exam():
+            # Forget the exam in progress, so every request assembles a new exam (and creates its ExamAttempt)
+            session = client.session
+            session.pop('exam_attempt_id', None)
+            session.save()
+            return client.get(exam_url)
+
+        def submit_exam():
+            page = client.get(exam_url)
+            # A random answer per question of the page, so the form itself costs no query
+            form = {f"question_{question.id}": str(rng.choice(question.choices).id)
+                    for question in page.context['questions']}
+            return client.post(exam_url, form)
+
+        endpoints = {}
+        endpoints['take_exam GET (new exam)'] = self.measure('take_exam GET (new exam)', new_exam, options)
+        client.get(exam_url)
+        endpoints['take_exam GET (refresh)'] = self.measure('take_exam GET (refresh)', lambda: client.get(exam_url), options)
+        endpoints['take_exam GET+POST'] = self.measure('take_exam GET+POST', submit_exam, options)
+        endpoints['user_statistics_view'] = self.measure('user_statistics_view', lambda: client.get(stats_url), options)
+        endpoints['user_chart_view'] = self.measure(
+            'user_chart_view', lambda: client.get(reverse('user_chart', args=['line'])), options)
+        endpoints['report download (csv)'] = self.measure(
+            'report download (csv)', lambda: client.get(stats_url, {'download': '1', 'format': 'csv'}), options)
+
+        return {
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'parameters': {key: options[key] for key in ('questions', 'results', 'users', 'requests', 'seed')},
+            'shape': {'question_length': shape['question_length'], 'answer_length': shape['answer_length'],
+                      'mean_answers_per_question': round(statistics.mean(shape['answers_per_question']), 2)},
+            'endpoints': endpoints,
+            'load_exam_data': self.measure_import(options['questions'], shape, rng),
+            'exam_size': EXAM_QUESTION_COUNT,
+        }
+
+    def compare(self, report, path):
+        # Prints how the p50/p95 latencies moved against an earlier run
+        with open(path, encoding='utf-8') as f:
+            previous = json.load(f)
+        self.stdout.write(f"\nCompared with {path} ({previous.get('timestamp', '?')}):")
+        for name, current in report['endpoints'].items():
+            before = previous.get('endpoints', {}).get(name)
+            if not before:
+                continue
+            for key in ('p50_ms', 'p95_ms'):
+                change = (current[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+                style = self.style.ERROR if change > 10 else self.style.SUCCESS
+                self.stdout.write(style(f"{name:<28} {key} {before[key]:>9.2f} -> {current[key]:>9.2f} ms ({change:+.1f}%)"))
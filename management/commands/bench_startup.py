@@ -0,0 +1,165 @@
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+# Packages a worker must not import at startup (they are only needed for charts and analytics)
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib')
+
+# What the child interpreter imports in each scenario, after django.setup()
+SCENARIOS = {
+    # Django and the installed apps (models) only
+    'django': "",
+    # A worker that is ready to serve requests: the URLconf and with it every view module
+    'worker': "from django.urls import get_resolver; get_resolver().url_patterns; import exam_app.views",
+    # The same worker after it has drawn a chart (plotting.py is imported on the first cache miss)
+    'worker_after_chart': "from django.urls import get_resolver; get_resolver().url_patterns; "
+                          "import exam_app.views, exam_app.plotting",
+}
+
+# Runs in the child interpreter; prints the measurements as one JSON line on stdout
+CHILD_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+{statement}
+elapsed = time.perf_counter() - started
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_kb = rss // 1024 if sys.platform == 'darwin' else rss  # bytes on macOS, KB on Linux
+except ImportError:
+    rss_kb = None
+heavy = sorted(name for name in {heavy!r} if name in sys.modules)
+print(json.dumps({{'seconds': elapsed, 'max_rss_kb': rss_kb, 'heavy_modules': heavy}}))
+"""
+
+# "import time:       412 |       1033 |   django.db" (self and cumulative in microseconds)
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def parse_importtime(stderr):
+    """
+    Sums up the output of python -X importtime.
+    Input: stderr (text of the child interpreter's standard error)
+    Output: (total import time in ms, {top-level package: self time in ms})
+    """
+    total_us = 0
+    per_package = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = int(match[1]), int(match[2]), match[3], match[4]
+        # Modules imported directly by the script (least indented) carry everything below them in "cumulative"
+        if len(indent) <= 1:
+            total_us += cumulative_us
+        package = module.split('.')[0]
+        per_package[package] = per_package.get(package, 0) + self_us
+    return total_us / 1000, {name: us / 1000 for name, us in per_package.items()}
+
+
+class Command(BaseCommand):
+    """
+    Custom Django Management Command that measures how expensive it is to start a worker.
+    Usage: python manage.py bench_startup [--runs 5] [--top 10] [--output bench_startup.json]
+           [--compare previous.json] [--check]
+    Input: The current settings (DJANGO_SETTINGS_MODULE); every scenario runs in a fresh
+    "python -X importtime" interpreter, so nothing is cached from this process.
+    Output: Per scenario the median import time, wall time and peak RSS, the packages that cost the most
+    import time, and which heavy packages (pandas, numpy, matplotlib) got loaded, printed and written as JSON.
+    With --check it fails if a worker loads a heavy package before drawing a chart.
+    """
+    help = 'Measures worker import time (python -X importtime) and memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per scenario (default: 5)")
+        parser.add_argument('--top', type=int, default=10, help="Number of most expensive packages listed (default: 10)")
+        parser.add_argument('--output', default='bench_startup.json', help="Where to write the JSON results")
+        parser.add_argument('--compare', help="Earlier JSON results to compare the import time and RSS with")
+        parser.add_argument('--check', action='store_true',
+                            help="Fail if the 'worker' scenario imports pandas, numpy or matplotlib")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        # The child must find the project (and its settings) like this process does
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.getcwd(), env.get('PYTHONPATH')]))
+
+        scenarios = {}
+        for name, statement in SCENARIOS.items():
+            scenarios[name] = self.measure(name, statement, env, options)
+
+        report = {
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'runs': options['runs'],
+            'scenarios': scenarios,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            self.compare(report, options['compare'])
+
+        heavy = scenarios['worker']['heavy_modules']
+        if options['check'] and heavy:
+            raise CommandError(f"A worker imports {', '.join(heavy)} at startup; import them lazily.")
+
+    def measure(self, name, statement, env, options):
+        import_ms, seconds, rss, packages, heavy = [], [], [], {}, set()
+        script = CHILD_SCRIPT.format(statement=statement, heavy=HEAVY_MODULES)
+        for _ in range(max(1, options['runs'])):
+            child = subprocess.run([sys.executable, '-X', 'importtime', '-c', script],
+                                   capture_output=True, text=True, env=env)
+            if child.returncode != 0:
+                raise CommandError(f"Scenario '{name}' failed:\n{child.stderr[-2000:]}")
+            measured = json.loads(child.stdout.strip().splitlines()[-1])
+            total, per_package = parse_importtime(child.stderr)
+            import_ms.append(total)
+            seconds.append(measured['seconds'])
+            if measured['max_rss_kb'] is not None:
+                rss.append(measured['max_rss_kb'])
+            for package, ms in per_package.items():
+                packages.setdefault(package, []).append(ms)
+            heavy.update(measured['heavy_modules'])
+
+        top = sorted(((package, statistics.median(values)) for package, values in packages.items()),
+                     key=lambda item: -item[1])[:options['top']]
+        result = {
+            'import_ms': round(statistics.median(import_ms), 1),
+            'wall_ms': round(statistics.median(seconds) * 1000, 1),
+            'max_rss_kb': round(statistics.median(rss)) if rss else None,
+            'heavy_modules': sorted(heavy),
+            'top_packages_ms': {package: round(ms, 1) for package, ms in top},
+        }
+
+        style = self.style.WARNING if heavy and name == 'worker' else self.style.SUCCESS
+        self.stdout.write(style(f"{name:<20} imports {result['import_ms']:>8.1f} ms  wall {result['wall_ms']:>8.1f} ms  "
+                                f"RSS {result['max_rss_kb'] or '?'} KB  heavy: {', '.join(result['heavy_modules']) or '-'}"))
+        for package, ms in result['top_packages_ms'].items():
+            self.stdout.write(f"    {package:<28} {ms:>8.1f} ms")
+        return result
+
+    def compare(self, report, path):
+        # Prints how the import time and memory moved against an earlier run
+        with open(path, encoding='utf-8') as f:
+            previous = json.load(f)
+        self.stdout.write(f"\nCompared with {path} ({previous.get('timestamp', '?')}):")
+        for name, current in report['scenarios'].items():
+            before = previous.get('scenarios', {}).get(name)
+            if not before:
+                continue
+            for key in ('import_ms', 'max_rss_kb'):
+                if not before.get(key) or current.get(key) is None:
+                    continue
+                change = (current[key] - before[key]) / before[key] * 100
+                style = self.style.ERROR if change > 10 else self.style.SUCCESS
+                self.stdout.write(style(f"{name:<20} {key:<10} {before[key]:>10} -> {current[key]:>10} ({change:+.1f}%)"))
@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from exam_app.rollups import CHUNK_SIZE, build_rollups
+
+class Command(BaseCommand):
+    """
+    Custom Django Management Command to update the hourly and daily exam totals (ExamRollup)
+    that the cohort dashboard reads. Run it regularly (e.g. every few minutes from cron).
+    Usage: python manage.py build_rollups [--backfill] [--chunk-size 50000]
+    Input: The ExamResult rows added since the last run (or all of them with --backfill).
+    Output: Updated ExamRollup rows and the position of the next run (see rollups.py).
+    """
+    help = 'Updates the hourly and daily exam rollups of the cohort dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true',
+                            help="Delete the rollups and rebuild them from the whole history")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help=f"Exam results grouped per query (default: {CHUNK_SIZE})")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            summary = build_rollups(backfill=options['backfill'], chunk_size=options['chunk_size'])
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Error while updating the rollups: {e}"))
+            return
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Added {summary['results']} exam results to {summary['rows']} hourly and daily rollups "
+            f"in {elapsed:.2f} s (processed up to result {summary['watermark']})."
+        ))
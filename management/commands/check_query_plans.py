@@ -0,0 +1,73 @@
+import re
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from exam_app.models import Question, Choice, ExamResult, ExamAnswer, ExamAttempt, ExamRollup, UserExamStats, UserMissSet
+
+# "SCAN <table>" means SQLite reads the whole table (or a whole index) instead of searching it
+SCAN_PATTERN = re.compile(r'\bSCAN (?!CONSTANT ROW)(\S+)')
+# "USE TEMP B-TREE FOR ORDER BY" means the rows are sorted after reading, the index doesn't give the order
+SORT_PATTERN = re.compile(r'USE TEMP B-TREE FOR ORDER BY')
+
+
+def hot_path_queries():
+    """
+    The queries the exam and statistics pages run on every request, with placeholder values.
+    Input: None
+    Output: A list of (name, queryset, sorting allowed) tuples. Queries that sort aggregated rows
+    (e.g. by number of misses) can't get their order from an index, so they may sort.
+    """
+    return [
+        ("user history by date", ExamResult.objects.filter(user_id=1).order_by('date_taken'), False),
+        ("exam in progress", ExamAttempt.objects.filter(pk=1, user_id=1, submitted_at__isnull=True), False),
+        ("latest result of a user", ExamResult.objects.official().filter(user_id=1).order_by('-id')[:1], False),
+        ("grading: chosen choices", Choice.objects.filter(id__in=[1, 2], question_id__in=[1, 2], is_correct=True), False),
+        ("choices of a question", Choice.objects.filter(question_id=1, is_correct=True), False),
+        ("import: question by content key", Question.objects.filter(content_hash='0' * 40), False),
+        ("user totals", UserExamStats.objects.filter(user_id=1), False),
+        ("practice: missed questions of a user", UserMissSet.objects.filter(user_id=1), False),
+        ("missed questions of a user", ExamAnswer.objects.filter(user_id=1, is_correct=False).values('question_id'), False),
+        ("cohort dashboard: rollups since a day",
+         ExamRollup.objects.filter(period='day', period_start__gte=timezone.make_aware(datetime.datetime(2024, 1, 1)))
+         .order_by('period_start'), False),
+        ("most missed questions of a user", ExamAnswer.objects.most_missed(user=1), True),
+    ]
+
+
+class Command(BaseCommand):
+    """
+    Custom Django Management Command that checks the query plans of the hot-path queries on SQLite,
+    so a change that drops an index (and falls back to a full table scan) fails CI.
+    Usage: python manage.py check_query_plans [--verbose]
+    Input: The current database schema (run it after migrate, e.g. on the CI test database).
+    Output: One line per query; exits with an error if any query scans a table or sorts unexpectedly.
+    """
+    help = 'Fails if a hot-path query is planned as a full table scan (SQLite EXPLAIN QUERY PLAN)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose', action='store_true', help="Print the full query plan of every query")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write(self.style.WARNING(f"Query plans are only checked on SQLite, not {connection.vendor}."))
+            return
+
+        failures = []
+        for name, queryset, sorting_allowed in hot_path_queries():
+            # On SQLite, explain() returns the EXPLAIN QUERY PLAN output
+            plan = queryset.explain()
+            problems = [f"full scan of {table}" for table in SCAN_PATTERN.findall(plan)]
+            if not sorting_allowed and SORT_PATTERN.search(plan):
+                problems.append("sort without index")
+
+            if problems:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"FAIL {name}: {', '.join(problems)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok   {name}"))
+            if problems or options['verbose']:
+                self.stdout.write("     " + plan.replace("\n", "\n     "))
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot-path queries lost their index: {', '.join(failures)}")
@@ -1,78 +1,503 @@
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 from django.core.management.base import BaseCommand
-from exam_app.models import Question, Choice
+from django.db import transaction
+from django.utils import timezone
+from exam_app.models import Question, Choice, QuestionBankVersion
+from exam_app.bank_cache import invalidate_local
+from exam_app.bank_files import find_banks, parse_bank
+from exam_app.merge_data import DEFAULT_CHUNK_SIZE, iter_merged_rows
+
+REQUIRED_COLUMNS = ['question_text', 'answer_text', 'is_correct']
 
 class Command(BaseCommand):
     """
     Custom Django Management Command to load data from a CSV file to the database.
-    Usage: python manage.py load_exam_data
-    Input: A CSV file named 'final_exam_data.csv' in the root directory, which contains merged question and answer data.
+    Usage: python manage.py load_exam_data [--file final_exam_data.csv] [--batch-size 1000] [--dry-run] [--replace]
+           python manage.py load_exam_data --questions driving_questions-1.csv --answers driving_answers_improved-1.csv
+           python manage.py load_exam_data --banks data/banks/ [--workers 4] [--report import_report.json]
+    Input: A CSV file named 'final_exam_data.csv' in the root directory, which contains merged question and answer data,
+    or the two source files, which are joined on the fly (see merge_data.iter_merged_rows) without writing the merged file.
     Output: Populates the Question and Choice tables in the database with the data from the CSV file.
+    The rows are streamed in chunks, grouped by question text and written with batched bulk_create()
+    inside one transaction, so a reload costs a handful of queries instead of 2-3 per answer,
+    and memory is bounded by --chunk-size and --batch-size instead of the bank size.
+    By default the file is synced against the database: questions are matched by their content
+    key (Question.content_hash) and answers by their text, and only the differences are written,
+    so IDs stay stable across imports. --replace deletes the whole bank and loads it again.
+    Every question belongs to a bank (Question.bank, --bank, '' by default); syncing and retiring only
+    touch the questions of the bank being imported. With --banks, several banks (a directory of banks or a glob,
+    see bank_files.py) are parsed and validated in parallel on a process pool, each valid bank is written in its
+    own transaction, and a JSON validation report lists the problems of every bank; a bad bank is skipped
+    without blocking the others.
     """
-    help = 'Loads exam data from a single merged CSV file'
+    help = 'Loads exam data from a merged CSV file, a questions/answers pair, or several banks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default='final_exam_data.csv',
+                            help="Merged CSV file to import (default: final_exam_data.csv)")
+        parser.add_argument('--questions',
+                            help="Questions CSV; together with --answers it is imported without the merged file")
+        parser.add_argument('--answers',
+                            help="Answers CSV; together with --questions it is imported without the merged file")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help=f"Number of CSV rows read from disk at a time (default: {DEFAULT_CHUNK_SIZE})")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of questions written to the database per batch (default: 1000)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only read and validate the file, do not touch the database")
+        parser.add_argument('--replace', action='store_true',
+                            help="Delete every question of the bank and load the file from scratch instead of syncing")
+        parser.add_argument('--bank', default='',
+                            help="Name of the bank the file belongs to (default: the unnamed default bank)")
+        parser.add_argument('--banks',
+                            help="Directory of banks, or a glob of bank directories / merged CSV files, to import together")
+        parser.add_argument('--workers', type=int,
+                            help="Processes that parse the banks of --banks (default: one per CPU)")
+        parser.add_argument('--report', default='import_report.json',
+                            help="Where --banks writes the JSON validation report (default: import_report.json)")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        chunk_size = options['chunk_size']
+        if batch_size < 1 or chunk_size < 1:
+            self.stdout.write(self.style.ERROR("Error: --batch-size and --chunk-size must be at least 1."))
+            return
+        if bool(options['questions']) != bool(options['answers']):
+            self.stdout.write(self.style.ERROR("Error: --questions and --answers must be given together."))
+            return
+        if options['banks']:
+            self.import_banks(options)
+            return
+        bank = options['bank']
+        max_length = Question._meta.get_field('bank').max_length
+        if len(bank) > max_length:
+            self.stdout.write(self.style.ERROR(f"Error: --bank can't be longer than {max_length} characters."))
+            return
+
+        # 1. Open the source
+        # Either the merged file, or the questions/answers pair joined while streaming.
+        if options['questions']:
+            source = f"{options['questions']} + {options['answers']}"
+            rows = iter_merged_rows(options['questions'], options['answers'], chunk_size)
+        else:
+            source = options['file']
+            rows = iter_csv_rows(source, chunk_size)
+        self.stdout.write(f"Reading {source}...")
 
-    def handle(self, *args, **kwargs):
-        # 1. Read the new single CSV file
-        file_path = 'final_exam_data.csv'
-        self.stdout.write(f"Reading {file_path}...")
-        
         try:
-            # Read the file (using semicolon delimiter)
-            # Note: We use delimiter=';' because our file uses semicolons, not commas.
-            df = pd.read_csv(file_path, delimiter=';')
-            
-            # Validate that the necessary columns actually exist
-            required_cols = ['question_text', 'answer_text', 'is_correct']
-            if not all(col in df.columns for col in required_cols):
-                raise KeyError(f"Missing one or more required columns: {required_cols}")
+            # The readers are lazy generators: pulling the first row opens the files,
+            # so a missing file or column is reported here, before the database is touched.
+            first = next(rows, None)
+            if first is None:
+                raise pd.errors.EmptyDataError("No rows")
+            rows = itertools.chain([first], rows)
 
         except FileNotFoundError as e:
             self.stdout.write(self.style.ERROR(f"Error: Could not find file. {e}"))
-            return    
+            return
         except pd.errors.EmptyDataError:
             self.stdout.write(self.style.ERROR("Error: The CSV file is empty."))
             return
-        except KeyError as e:
+        except (KeyError, ValueError) as e:
             self.stdout.write(self.style.ERROR(f"Data format error: {e}"))
             return
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Unexpected file reading error: {e}"))
             return
 
-        # 2. Clean the database
-        # We delete all existing questions to start fresh.
-        # This automatically deletes linked Choices (Cascade delete).
-        self.stdout.write("Cleaning old data...")
-        Question.objects.all().delete()
-        
-        # 3. Loop through every row in the CSV
-        self.stdout.write("Importing new data...")
-        
-        # iterrows(): Loops through the table one row at a time.
+        # 2. Group the answers by question text while streaming
+        # The question text appears once per answer choice in the file, so instead of
+        # asking the database "does this question exist?" for every row (get_or_create),
+        # consecutive rows are collected into {question_text: [(answer_text, is_correct), ...]}
+        # batches of --batch-size questions.
+        started = time.perf_counter()
+        counts = {'questions': 0, 'rows': 0}
+        batches = iter_batches(iter_question_groups(rows, counts, bank), batch_size)
+
+        if options['dry_run']:
+            try:
+                for _ in batches:
+                    pass
+            except ValueError as e:
+                self.stdout.write(self.style.ERROR(f"Data format error: {e}"))
+                return
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"Dry run: {counts['questions']} questions and {counts['rows']} answer choices are valid "
+                f"({elapsed:.2f}s). The database was not changed."
+            ))
+            return
+
+        # 3. Write the bank in a single transaction
+        # If anything fails half way, the old questions are still there (nothing is committed),
+        # and the exam is never served a half-loaded bank.
+        try:
+            with transaction.atomic():
+                if options['replace']:
+                    # We delete all existing questions of the bank to start fresh.
+                    # This automatically deletes linked Choices (Cascade delete).
+                    self.stdout.write("Cleaning old data...")
+                    Question.objects.filter(bank=bank).delete()
+
+                    self.stdout.write("Importing new data...")
+                    for grouped in batches:
+                        bulk_insert(grouped, batch_size, bank)
+                else:
+                    self.stdout.write("Syncing with the database...")
+                    changes = sync_bank(batches, batch_size, bank)
+
+                # Tell the workers that their cached copy of the bank is out of date (see bank_cache.py)
+                QuestionBankVersion.bump()
+                transaction.on_commit(invalidate_local)
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(f"Data format error: {e}. The database was not changed."))
+            return
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Error while saving to database: {e}"))
+            return
+
+        elapsed = time.perf_counter() - started
+        rate = counts['rows'] / elapsed if elapsed > 0 else float(counts['rows'])
+        if options['replace']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Successfully loaded {counts['questions']} questions and {counts['rows']} answer choices "
+                f"in {elapsed:.2f}s ({rate:,.0f} rows/s)!"
+            ))
+            return
+
+        # 4. Change summary
+        self.write_changes(changes)
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully synced {counts['questions']} questions and {counts['rows']} answer choices "
+            f"in {elapsed:.2f}s ({rate:,.0f} rows/s)!"
+        ))
+
+    def write_changes(self, changes, prefix=""):
+        self.stdout.write(
+            f"{prefix}Questions: {changes['questions_added']} added, {changes['questions_reactivated']} reactivated, "
+            f"{changes['questions_retired']} retired, {changes['questions_unchanged']} unchanged\n"
+            f"{prefix}Answers:   {changes['choices_added']} added, {changes['choices_updated']} updated, "
+            f"{changes['choices_removed']} removed"
+        )
+
+    def import_banks(self, options):
+        """
+        Imports several banks: parsed and validated in parallel, written one by one.
+        Input: the command options (--banks, --workers, --report, --batch-size, --dry-run, --replace)
+        Output: None; prints one line per bank and writes the JSON validation report.
+        """
         try:
-            for index, row in df.iterrows():
-                q_text = row['question_text']
-                a_text = row['answer_text']
-                # Convert 0/1 to False/True
-                is_correct_val = bool(row['is_correct']) 
-                # KEY LOGIC: Get the question if it exists, or create it if it's new.
-                # We use get_or_create() because the question text appears multiple 
-                # times in the file (once for each answer choice).
-                # text is the destination column in our Question model.
-                # q_text is the source, which is the text from our merged CSV file.
-                ## tuple unpacking: get_or_create() returns a tuple (object, created), 
-                ## where 'object' is the Question instance 
-                ## and 'created' is a boolean indicating if it was newly created or already existed.
-                question, created = Question.objects.get_or_create(text=q_text)
-
-                # Create the answer choice linked to this question
-                Choice.objects.create(
-                    # question is the Foreign Key column in the Choice database (question_id)
-                    question=question,
-                    text=a_text,
-                    is_correct=is_correct_val
-                )
-
-            self.stdout.write(self.style.SUCCESS(f'Successfully loaded {len(df)} answer choices!'))
+            banks = find_banks(options['banks'], Question._meta.get_field('bank').max_length)
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(f"Error: {e}."))
+            return
+        if not banks:
+            self.stdout.write(self.style.ERROR(f"Error: No banks found in {options['banks']}."))
+            return
+        names = [name for name, _ in banks]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            self.stdout.write(self.style.ERROR(f"Error: Two banks have the same name: {', '.join(duplicates)}."))
+            return
+
+        workers = options['workers'] or min(len(banks), os.cpu_count() or 1)
+        max_length = Choice._meta.get_field('text').max_length
+        self.stdout.write(f"Reading {len(banks)} banks with {workers} processes...")
+        started = time.perf_counter()
+        report = {'started_at': timezone.now().isoformat(), 'source': options['banks'],
+                  'dry_run': options['dry_run'], 'banks': []}
+
+        # The workers only parse and validate (no database access); the banks are written here, one at a time
+        # and in name order, while the later banks are still being parsed.
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(parse_bank, name, layout, max_length) for name, layout in banks]
+            for (name, layout), future in zip(banks, futures):
+                try:
+                    parsed = future.result()
+                except Exception as e:
+                    parsed = {'bank': name, 'source': None, 'questions': [], 'rows': 0,
+                              'issues': [{'type': 'unreadable', 'file': name, 'line': 0, 'detail': str(e)}],
+                              'issue_counts': {'unreadable': 1}}
+                report['banks'].append(self.write_bank(parsed, options))
+
+        statuses = [entry['status'] for entry in report['banks']]
+        report['summary'] = {status: statuses.count(status) for status in sorted(set(statuses))}
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        with open(options['report'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+        summary = ", ".join(f"{count} {status}" for status, count in report['summary'].items())
+        style = self.style.SUCCESS if statuses.count('invalid') + statuses.count('failed') == 0 else self.style.WARNING
+        self.stdout.write(style(f"{len(banks)} banks in {report['seconds']:.2f}s: {summary}. "
+                                f"Report written to {options['report']}"))
+
+    def write_bank(self, parsed, options):
+        """
+        Writes one parsed bank in its own transaction, unless it has validation problems.
+        Input: parsed (from bank_files.parse_bank), options (the command options)
+        Output: The bank's entry of the validation report, with its status: valid (dry run), imported, invalid or failed.
+        """
+        bank = parsed['bank']
+        entry = {
+            'bank': bank, 'source': parsed['source'], 'questions': len(parsed['questions']), 'rows': parsed['rows'],
+            'issue_counts': parsed['issue_counts'], 'issues': parsed['issues'],
+        }
+        if not parsed['issue_counts'] and not parsed['questions']:
+            entry['issue_counts'] = {'empty_file': 1}
+            entry['issues'] = [{'type': 'empty_file', 'file': parsed['source'], 'line': 1, 'detail': "No rows"}]
+
+        if entry['issue_counts']:
+            entry['status'] = 'invalid'
+            problems = ", ".join(f"{count} {kind}" for kind, count in sorted(entry['issue_counts'].items()))
+            self.stdout.write(self.style.ERROR(f"[{bank}] skipped, {problems}"))
+            return entry
+        if options['dry_run']:
+            entry['status'] = 'valid'
+            self.stdout.write(self.style.SUCCESS(f"[{bank}] {entry['questions']} questions and {entry['rows']} answers are valid"))
+            return entry
+
+        batch_size = options['batch_size']
+        groups = ((Question.make_key(q_text, bank), q_text, answers) for q_text, answers in parsed['questions'])
+        batches = iter_batches(groups, batch_size)
+        try:
+            # One transaction per bank: a failing bank is rolled back alone, the others stay imported
+            with transaction.atomic():
+                if options['replace']:
+                    Question.objects.filter(bank=bank).delete()
+                    for grouped in batches:
+                        bulk_insert(grouped, batch_size, bank)
+                    changes = None
+                else:
+                    changes = sync_bank(batches, batch_size, bank)
+                QuestionBankVersion.bump()
+                transaction.on_commit(invalidate_local)
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Error while saving to database: {e}"))
\ No newline at end of file
+            entry['status'] = 'failed'
+            entry['error'] = str(e)
+            self.stdout.write(self.style.ERROR(f"[{bank}] Error while saving to database: {e}"))
+            return entry
+
+        entry['status'] = 'imported'
+        entry['changes'] = changes
+        self.stdout.write(self.style.SUCCESS(f"[{bank}] imported {entry['questions']} questions and {entry['rows']} answers"))
+        if changes:
+            self.write_changes(changes, prefix=f"[{bank}] ")
+        return entry
+
+
+def iter_csv_rows(file_path, chunksize=DEFAULT_CHUNK_SIZE):
+    """
+    Streams the rows of a merged CSV file (the output of merge_data.merge_exam_data).
+    Input: file_path (semicolon separated CSV), chunksize (number of rows held in memory at a time).
+    Output: A generator of (question_text, answer_text, is_correct) tuples.
+    Raises KeyError if one of the required columns is missing.
+    """
+    # Read the header only, to validate that the necessary columns actually exist
+    header = pd.read_csv(file_path, delimiter=';', nrows=0)
+    if not all(col in header.columns for col in REQUIRED_COLUMNS):
+        raise KeyError(f"Missing one or more required columns: {REQUIRED_COLUMNS}")
+
+    # Note: We use delimiter=';' because our file uses semicolons, not commas.
+    for chunk in pd.read_csv(file_path, delimiter=';', usecols=REQUIRED_COLUMNS, chunksize=chunksize):
+        yield from chunk[REQUIRED_COLUMNS].itertuples(index=False, name=None)
+
+
+def iter_question_groups(rows, counts=None, bank=''):
+    """
+    Groups consecutive merged CSV rows by their question text, keeping the file order.
+    The answers of one question must be next to each other, which is how the answers file is laid out
+    (sorted by question_id), so only one question is held in memory at a time.
+    Input: An iterable of (question_text, answer_text, is_correct) tuples, an optional counts dict
+    whose 'questions' and 'rows' entries are increased while the groups are produced, and the bank name (for the keys).
+    Output: A generator of (content_key, question_text, [(answer_text, is_correct), ...]) tuples.
+    Raises ValueError if a row has an empty text or a non 0/1 correctness flag, if an answer
+    is repeated within a question (answers are matched by text when syncing), or if the answers
+    of a question are split over two places in the file.
+    """
+    finished = set()  # content keys of the questions already produced
+    current_key, current_text, current_answers = None, None, []
+    for line, (q_text, a_text, is_correct) in enumerate(rows, start=2):  # line 1 is the header
+        if pd.isna(q_text) or pd.isna(a_text) or not str(q_text).strip() or not str(a_text).strip():
+            raise ValueError(f"Empty question or answer text on line {line}")
+        if is_correct not in (0, 1):
+            raise ValueError(f"is_correct must be 0 or 1 on line {line}, got {is_correct!r}")
+        q_text, a_text = str(q_text).strip(), str(a_text).strip()
+
+        if q_text != current_text:
+            if current_text is not None:
+                finished.add(current_key)
+                yield current_key, current_text, current_answers
+            current_key = Question.make_key(q_text, bank)
+            if current_key in finished:
+                raise ValueError(f"The answers of a question are split over the file (line {line}); "
+                                 f"sort the answers by question first")
+            current_text, current_answers = q_text, []
+            if counts is not None:
+                counts['questions'] += 1
+
+        if any(a_text == text for text, _ in current_answers):
+            raise ValueError(f"Duplicate answer for the same question on line {line}")
+        # Convert 0/1 to False/True
+        current_answers.append((a_text, bool(is_correct)))
+        if counts is not None:
+            counts['rows'] += 1
+
+    if current_text is not None:
+        yield current_key, current_text, current_answers
+
+
+def iter_batches(groups, batch_size):
+    """
+    Collects question groups into batches for the database writers.
+    Input: groups (from iter_question_groups), batch_size (questions per batch).
+    Output: A generator of dicts {content_key: (question_text, [(answer_text, is_correct), ...])}.
+    """
+    batch = {}
+    for key, q_text, answers in groups:
+        batch[key] = (q_text, answers)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = {}
+    if batch:
+        yield batch
+
+
+def bulk_insert(grouped, batch_size, bank=''):
+    """
+    Writes one batch of grouped questions and their choices with bulk_create() calls.
+    Must be called inside a transaction.
+    Input: grouped ({content_key: (question_text, [(answer_text, is_correct), ...])}), batch_size (rows per INSERT),
+    bank (the bank the questions belong to).
+    Output: A (question_count, choice_count) tuple.
+    """
+    # bulk_create() skips Question.save(), so the content key is filled in here.
+    questions = Question.objects.bulk_create(
+        [Question(text=q_text, content_hash=key, bank=bank) for key, (q_text, _) in grouped.items()],
+        batch_size=batch_size,
+    )
+    ids_by_key = _created_ids(questions, list(grouped))
+
+    choices = [
+        # question_id is the Foreign Key column in the Choice database
+        Choice(question_id=ids_by_key[key], text=a_text, is_correct=is_correct)
+        for key, (_, answers) in grouped.items()
+        for a_text, is_correct in answers
+    ]
+    Choice.objects.bulk_create(choices, batch_size=batch_size)
+    return len(questions), len(choices)
+
+
+def sync_bank(batches, batch_size, bank=''):
+    """
+    Diffs the grouped CSV rows against the database and writes only what changed.
+    Questions are matched by Question.content_hash, answers by their text within the question
+    (an answer whose text was edited is a new choice, see _sync_batch).
+    Questions of the bank missing from the file are retired (is_active=False), never deleted;
+    the questions of other banks are not touched.
+    Must be called inside a transaction.
+    Input: batches (from iter_batches), batch_size (rows per query), bank (the bank the file belongs to).
+    Output: A dict with the number of added/reactivated/retired/unchanged questions
+    and added/updated/removed answer choices.
+    """
+    changes = dict.fromkeys([
+        'questions_added', 'questions_reactivated', 'questions_retired', 'questions_unchanged',
+        'choices_added', 'choices_updated', 'choices_removed',
+    ], 0)
+
+    # {content_hash: (id, is_active)} for the whole bank, two short columns per question
+    existing = {key: (pk, active) for pk, key, active in
+                Question.objects.filter(bank=bank).values_list('id', 'content_hash', 'is_active')}
+    seen = set()
+
+    for grouped in batches:
+        seen.update(grouped)
+        _sync_batch(grouped, existing, changes, batch_size, bank)
+
+    # Questions that are not in the file anymore are retired
+    retire = [pk for key, (pk, active) in existing.items() if key not in seen and active]
+    for start in range(0, len(retire), batch_size):
+        Question.objects.filter(id__in=retire[start:start + batch_size]).update(is_active=False)
+    changes['questions_retired'] = len(retire)
+    return changes
+
+
+def _sync_batch(grouped, existing, changes, batch_size, bank=''):
+    """
+    Applies one batch of sync_bank(): adds new questions, reactivates returning ones
+    and diffs the choices of the questions that already existed.
+    Input: grouped (one batch from iter_batches), existing ({content_hash: (id, is_active)}),
+    changes (the counters of sync_bank, updated in place), batch_size (rows per query), bank (for new questions).
+    Output: None
+    """
+    # 1. Questions: add the new ones, reactivate returning ones
+    new_keys = [key for key in grouped if key not in existing]
+    created = Question.objects.bulk_create(
+        [Question(text=grouped[key][0], content_hash=key, bank=bank) for key in new_keys], batch_size=batch_size
+    )
+    ids_by_key = _created_ids(created, new_keys)
+    changes['questions_added'] += len(created)
+
+    reactivate = [existing[key][0] for key in grouped if key in existing and not existing[key][1]]
+    if reactivate:
+        Question.objects.filter(id__in=reactivate).update(is_active=True)
+    changes['questions_reactivated'] += len(reactivate)
+
+    # 2. Choices of questions that already existed: diff them by answer text
+    kept_ids = {existing[key][0]: key for key in grouped if key in existing}
+    current = {}  # {question_id: {answer_text: (choice_id, is_correct)}}
+    rows = Choice.objects.filter(question_id__in=list(kept_ids)) \
+        .values_list('id', 'question_id', 'text', 'is_correct')
+    for choice_id, question_id, text, is_correct in rows:
+        current.setdefault(question_id, {})[text] = (choice_id, is_correct)
+
+    to_create, to_update, to_delete = [], [], []
+    for question_id, key in kept_ids.items():
+        in_db = current.get(question_id, {})
+        in_file = dict(grouped[key][1])
+        question_changed = False
+        for a_text, is_correct in in_file.items():
+            if a_text in in_db and in_db[a_text][1] != is_correct:
+                to_update.append(Choice(id=in_db[a_text][0], is_correct=is_correct))
+                question_changed = True
+        # A choice keeps its ID only while its text is the same: an edited answer is a new choice and the old
+        # one is removed, so ExamAnswer.choice and the distractor counts never point at a text nobody was shown
+        added = [(a_text, is_correct) for a_text, is_correct in in_file.items() if a_text not in in_db]
+        removed = [choice_id for a_text, (choice_id, _) in in_db.items() if a_text not in in_file]
+        for a_text, is_correct in added:
+            to_create.append(Choice(question_id=question_id, text=a_text, is_correct=is_correct))
+        to_delete.extend(removed)
+        if added or removed:
+            question_changed = True
+        if not question_changed and existing[key][1]:
+            changes['questions_unchanged'] += 1
+
+    # Brand new questions get all of their choices
+    for key, question_id in ids_by_key.items():
+        for a_text, is_correct in grouped[key][1]:
+            to_create.append(Choice(question_id=question_id, text=a_text, is_correct=is_correct))
+
+    Choice.objects.bulk_create(to_create, batch_size=batch_size)
+    Choice.objects.bulk_update(to_update, ['is_correct'], batch_size=batch_size)
+    if to_delete:
+        Choice.objects.filter(id__in=to_delete).delete()
+    changes['choices_added'] += len(to_create)
+    changes['choices_updated'] += len(to_update)
+    changes['choices_removed'] += len(to_delete)
+
+
+def _created_ids(created, keys):
+    """
+    Maps the content keys of freshly bulk-created questions to their new primary keys.
+    PostgreSQL and recent SQLite return the keys from bulk_create(); on backends
+    that don't, one query looks them up by content key.
+    Input: created (the list returned by bulk_create), keys (their content keys).
+    Output: A dict {content_hash: id}.
+    """
+    if created and created[0].pk is None:
+        return dict(Question.objects.filter(content_hash__in=keys).values_list('content_hash', 'id'))
+    return {q.content_hash: q.pk for q in created}
@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from exam_app.models import ExamResult, UserExamStats
+
+# Number of ExamResult rows fetched from the database at a time
+CHUNK_SIZE = 2000
+
+class Command(BaseCommand):
+    """
+    Custom Django Management Command to recompute the per-user statistics totals (UserExamStats)
+    from the full ExamResult history.
+    Usage: python manage.py rebuild_exam_stats [--verify]
+    Input: All official ExamResult rows (practice exams are not counted), streamed in id order.
+    Output: One up-to-date UserExamStats row per user with results. With --verify, the totals are
+    also compared with the pandas/NumPy calculation the statistics page used before, user by user.
+    """
+    help = 'Rebuilds the UserExamStats totals from the ExamResult history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help="Compare the totals with the pandas/NumPy results and report differences")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of UserExamStats rows written per query (default: 1000)")
+
+    def handle(self, *args, **options):
+        # 1. Stream the history once, ordered by user, and keep the totals of every user in memory
+        # (a UserExamStats object is a handful of numbers, the history itself is never held).
+        self.stdout.write("Reading exam results...")
+        all_stats = {}
+        rows = ExamResult.objects.official().order_by('user_id', 'id').values_list('id', 'user_id', 'score', 'passed')
+        for result_id, user_id, score, passed in rows.iterator(chunk_size=CHUNK_SIZE):
+            stats = all_stats.get(user_id)
+            if stats is None:
+                stats = all_stats[user_id] = UserExamStats(user_id=user_id)
+            stats.add_score(score, passed)
+            stats.last_result_id = result_id
+
+        # 2. Write them in one transaction. Existing rows are updated in place (update_conflicts),
+        # so the table is never empty while the statistics page reads it.
+        fields = ['exam_count', 'score_sum', 'mean', 'm2', 'max_score', 'passed_count', 'histogram', 'last_result_id']
+        try:
+            with transaction.atomic():
+                UserExamStats.objects.bulk_create(
+                    all_stats.values(), batch_size=options['batch_size'],
+                    update_conflicts=True, unique_fields=['user'], update_fields=fields,
+                )
+                # Users whose results were all deleted don't keep old totals
+                UserExamStats.objects.exclude(user_id__in=ExamResult.objects.official().values('user_id')).delete()
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Error while saving to database: {e}"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Successfully rebuilt the statistics of {len(all_stats)} users!"))
+
+        # 3. Optional check against the pandas/NumPy calculation
+        if options['verify']:
+            mismatches = verify_against_pandas(all_stats)
+            for user_id, field, expected, actual in mismatches:
+                self.stdout.write(self.style.ERROR(f"User {user_id}: {field} is {actual}, pandas gives {expected}"))
+            if mismatches:
+                self.stdout.write(self.style.ERROR(f"{len(mismatches)} differences found."))
+            else:
+                self.stdout.write(self.style.SUCCESS("All totals match the pandas/NumPy results."))
+
+
+def verify_against_pandas(all_stats, tolerance=1e-9):
+    """
+    Recomputes every user's metrics the way user_statistics_view did with pandas and NumPy,
+    and compares them with the incremental totals.
+    Input: all_stats ({user_id: UserExamStats}), tolerance (allowed float difference).
+    Output: A list of (user_id, field, pandas value, UserExamStats value) tuples, empty if everything matches.
+    """
+    # Only needed here, so the command doesn't pay for the import otherwise
+    import numpy as np
+    import pandas as pd
+
+    mismatches = []
+    for user_id, stats in all_stats.items():
+        df = pd.DataFrame(list(ExamResult.objects.official().filter(user_id=user_id).values('score', 'passed')))
+        df['score'] = pd.to_numeric(df['score'], errors='coerce')
+        scores_array = df['score'].dropna().to_numpy()
+        expected = {
+            'exam_count': len(df),
+            'mean': np.mean(scores_array) if len(scores_array) > 0 else 0,
+            'std_dev': np.std(scores_array) if len(scores_array) > 0 else 0,
+            'max_score': np.max(scores_array) if len(scores_array) > 0 else 0,
+            'success_rate': (df['passed'].sum() / len(df)) * 100 if len(df) > 0 else 0,
+            'histogram': np.bincount(scores_array.astype(int), minlength=UserExamStats.HISTOGRAM_SIZE).tolist(),
+        }
+        for field, value in expected.items():
+            actual = getattr(stats, field)
+            if field == 'histogram':
+                same = list(actual) == value
+            else:
+                same = abs(float(actual) - float(value)) <= tolerance * max(1.0, abs(float(value)))
+            if not same:
+                mismatches.append((user_id, field, value, actual))
+    return mismatches
@@ -1,43 +1,80 @@
+import itertools
 import pandas as pd
-import sys
 
-def merge_exam_data(questions_file='driving_questions-1.csv', answers_file='driving_answers_improved-1.csv', output_file='final_exam_data.csv'):
-    """ 
-    Reads two separate CSV files (questions and answers), 
+# Number of answer rows read from disk at a time. Peak memory of the streaming
+# pipeline is set by this value plus the question lookup, not by the bank size.
+DEFAULT_CHUNK_SIZE = 10000
+
+def iter_merged_rows(questions_file='driving_questions-1.csv', answers_file='driving_answers_improved-1.csv', chunksize=DEFAULT_CHUNK_SIZE):
+    """
+    Streams the join of the questions and answers files without building the merged table.
+    The questions file is read once into a compact {question_id: question_text} lookup,
+    then the answers file is read in chunks and every chunk is joined against the lookup.
+    Answers whose question_id has no question are dropped, like the inner join of merge_exam_data.
+    Input: questions_file (CSV with question_id and question_text), answers_file (CSV with question_id, answer_text, is_correct),
+    chunksize (number of answer rows held in memory at a time).
+    Output: A generator of (question_text, answer_text, is_correct) tuples in the order of the answers file.
+    Raises FileNotFoundError, ValueError (missing column) or pd.errors.EmptyDataError like pd.read_csv does.
+    """
+    questions = pd.read_csv(questions_file, delimiter=';', usecols=['question_id', 'question_text'])
+    lookup = dict(zip(questions['question_id'], questions['question_text']))
+    del questions  # only the lookup is kept while the answers are streamed
+
+    reader = pd.read_csv(answers_file, delimiter=';', usecols=['question_id', 'answer_text', 'is_correct'], chunksize=chunksize)
+    for chunk in reader:
+        chunk['question_text'] = chunk['question_id'].map(lookup)
+        chunk = chunk.dropna(subset=['question_text'])
+        yield from chunk[['question_text', 'answer_text', 'is_correct']].itertuples(index=False, name=None)
+
+def merge_exam_data(questions_file='driving_questions-1.csv', answers_file='driving_answers_improved-1.csv', output_file='final_exam_data.csv', chunksize=DEFAULT_CHUNK_SIZE):
+    """
+    Reads two separate CSV files (questions and answers),
     merges them based on a common 'question_id',
     and saves the result as a new CSV file with only the necessary columns for loading into Django.
+    The answers are streamed through iter_merged_rows() and written chunk by chunk,
+    so the merged table is never held in memory as a whole.
     Input: questions_file (CSV with question_id and question_text), answers_file (CSV with question_id, answer_text, is_correct).
     Output: A new CSV file that combines the question text with its corresponding answers and correctness, ready for import into the Django database.
     """
     try:
-        # Read the two separate files
-        questions = pd.read_csv(questions_file, delimiter=';')
-        answers = pd.read_csv(answers_file, delimiter=';')
+        rows = iter_merged_rows(questions_file, answers_file, chunksize)
+        # Pull the first row before creating the output file, so a missing or broken
+        # input file does not leave an empty 'final_exam_data.csv' behind.
+        first = next(rows, None)
+        rows = itertools.chain([first], rows) if first is not None else iter(())
+        columns = ['question_text', 'answer_text', 'is_correct']
+        total = 0
 
-        # Merge them together using 'question_id'
-        merged_df = pd.merge(answers, questions, on='question_id')
+        # Save to a new single CSV file, one chunk at a time
+        with open(output_file, 'w', newline='', encoding='utf-8') as out:
+            pd.DataFrame(columns=columns).to_csv(out, sep=';', index=False)
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= chunksize:
+                    pd.DataFrame(batch, columns=columns).to_csv(out, sep=';', index=False, header=False)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                pd.DataFrame(batch, columns=columns).to_csv(out, sep=';', index=False, header=False)
+                total += len(batch)
 
-        # Select only the needed columns
-        final_df = merged_df[['question_text', 'answer_text', 'is_correct']]
-
-        # Save to a new single CSV file
-        final_df.to_csv(output_file, sep=';', index=False)
-
-        print(f"Success! Created '{output_file}' with {len(final_df)} rows.")
+        print(f"Success! Created '{output_file}' with {total} rows.")
         return True
 
     except FileNotFoundError as e:
         print(f"Error: A required file is missing. {e}")
         return False
-    except KeyError as e:
-        print(f"Error: Missing expected column in the CSV files. {e}")
-        return False
     except pd.errors.EmptyDataError:
         print("Error: One of the CSV files is completely empty.")
         return False
+    except (KeyError, ValueError) as e:
+        # pd.read_csv(usecols=...) reports a missing column as a ValueError
+        print(f"Error: Missing expected column in the CSV files. {e}")
+        return False
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return False
 
 if __name__ == "__main__":
-    merge_exam_data()
\ No newline at end of file
+    merge_exam_data()
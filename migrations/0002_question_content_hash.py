@@ -0,0 +1,56 @@
+# exam_app/migrations/0002_question_content_hash.py
+# Adds the content key and the retired flag used by the load_exam_data sync.
+# A unique NOT NULL column can't be added to a filled table in one step, so the key is added as
+# nullable, filled from the question texts, and only then made unique and required.
+import hashlib
+
+from django.db import migrations, models
+
+# Number of questions read and updated at a time
+BATCH_SIZE = 1000
+
+
+def make_key(text):
+    # The same key as Question.make_key(text) for the default bank. The model's method is not
+    # available on the historical model, and a migration must not change when models.py does.
+    return hashlib.sha1(str(text).strip().encode('utf-8')).hexdigest()
+
+
+def fill_content_hash(apps, schema_editor):
+    Question = apps.get_model('exam_app', 'Question')
+    while True:
+        # Filled rows drop out of the filter, so every round reads the next batch
+        batch = list(Question.objects.filter(content_hash__isnull=True).order_by('id').only('id', 'text')[:BATCH_SIZE])
+        if not batch:
+            break
+        for question in batch:
+            question.content_hash = make_key(question.text)
+        Question.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='content_hash',
+            field=models.CharField(editable=False, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        # Two questions with the same text get the same key; the AlterField below then fails
+        # and the duplicates have to be merged (or removed) before migrating again.
+        migrations.RunPython(fill_content_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='question',
+            name='content_hash',
+            field=models.CharField(editable=False, max_length=40, unique=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# exam_app/migrations/0003_hot_path_indexes.py
+# Indexes of the queries every exam and statistics page runs (see the check_query_plans command).
+# "The choices of a question" needs none: the foreign key index on Choice.question already serves it.
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam_app', '0002_question_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='examresult',
+            index=models.Index(fields=['user', 'date_taken'], name='exam_result_user_date'),
+        ),
+        migrations.AddIndex(
+            model_name='examresult',
+            index=models.Index(fields=['user', 'id'], name='exam_result_user_id'),
+        ),
+    ]
@@ -0,0 +1,150 @@
+# exam_app/migrations/0004_exam_engine_tables.py
+# The tables of the bank cache, the statistics, the graded answers, the exam attempts,
+# the item analysis and the cohort rollups, and the question categories.
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('exam_app', '0003_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='category',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.CreateModel(
+            name='QuestionBankVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserExamStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exam_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.BigIntegerField(default=0)),
+                ('mean', models.FloatField(default=0.0)),
+                ('m2', models.FloatField(default=0.0)),
+                ('max_score', models.IntegerField(default=0)),
+                ('passed_count', models.PositiveIntegerField(default=0)),
+                ('histogram', models.JSONField(default=list)),
+                ('last_result_id', models.BigIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='exam_stats',
+                                              to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-mean', '-exam_count'], name='exam_stats_leaderboard')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExamAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_correct', models.BooleanField()),
+                ('choice', models.ForeignKey(blank=True, db_constraint=False, null=True,
+                                             on_delete=django.db.models.deletion.DO_NOTHING, related_name='+',
+                                             to='exam_app.choice')),
+                ('question', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING,
+                                               related_name='exam_answers', to='exam_app.question')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers',
+                                             to='exam_app.examresult')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['user', 'is_correct', 'question'], name='exam_answer_user_missed'),
+                    models.Index(fields=['question', 'is_correct'], name='exam_answer_question'),
+                ],
+                'constraints': [
+                    models.UniqueConstraint(fields=('result', 'question'), name='exam_answer_unique_question'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExamAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('deadline', models.DateTimeField()),
+                ('packed_question_ids', models.BinaryField()),
+                ('mode', models.CharField(default='exam', max_length=10)),
+                ('submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_attempts',
+                                           to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserMissSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bits', models.BinaryField(default=b'')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='miss_set',
+                                              to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExamRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=4)),
+                ('period_start', models.DateTimeField()),
+                ('exam_count', models.PositiveIntegerField(default=0)),
+                ('passed_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.BigIntegerField(default=0)),
+                ('score_square_sum', models.BigIntegerField(default=0)),
+                ('histogram', models.JSONField(default=list)),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(fields=('period', 'period_start'), name='exam_rollup_period'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProcessingWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING,
+                                                  primary_key=True, related_name='item_stats', serialize=False,
+                                                  to='exam_app.question')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('misses', models.PositiveIntegerField(default=0)),
+                ('passed_attempts', models.PositiveIntegerField(default=0)),
+                ('passed_correct', models.PositiveIntegerField(default=0)),
+                ('failed_attempts', models.PositiveIntegerField(default=0)),
+                ('failed_correct', models.PositiveIntegerField(default=0)),
+                ('miss_rate', models.FloatField(default=0.0)),
+                ('discrimination', models.FloatField(blank=True, null=True)),
+                ('distractor_counts', models.JSONField(default=dict)),
+                ('top_distractor_id', models.BigIntegerField(blank=True, null=True)),
+                ('top_distractor_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['miss_rate'], name='question_stats_miss_rate'),
+                    models.Index(fields=['discrimination'], name='question_stats_discrimination'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# exam_app/migrations/0005_examanswer_backfilled.py
+# Marks the ExamAnswer rows made by backfill_exam_answers, which the item analysis must skip.
+from django.db import migrations, models
+
+
+def mark_backfilled(apps, schema_editor):
+    # Rows that were backfilled before the flag existed: graded exams store a row for every question,
+    # so their score equals their number of correct rows; a backfilled result has no correct rows at all.
+    # (A backfilled result with score 0 is complete, every question was wrong, and stays unmarked.)
+    ExamAnswer = apps.get_model('exam_app', 'ExamAnswer')
+    ExamResult = apps.get_model('exam_app', 'ExamResult')
+    incomplete = ExamResult.objects.annotate(
+        correct=models.Count('answers', filter=models.Q(answers__is_correct=True)),
+    ).filter(score__gt=models.F('correct')).values('id')
+    ExamAnswer.objects.filter(result_id__in=incomplete).update(backfilled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam_app', '0004_exam_engine_tables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examanswer',
+            name='backfilled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_backfilled, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# exam_app/migrations/0006_examresult_mode.py
+# Practice results are stored with mode='practice' and left out of the statistics; existing results are official.
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam_app', '0005_examanswer_backfilled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examresult',
+            name='mode',
+            field=models.CharField(default='exam', max_length=10),
+        ),
+    ]
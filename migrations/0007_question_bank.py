@@ -0,0 +1,19 @@
+# exam_app/migrations/0007_question_bank.py
+# Questions belong to a bank (a licence class or a language); existing questions are in the default bank ''.
+# Their content keys don't change: the key of the default bank is the hash of the text alone.
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam_app', '0006_examresult_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='bank',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=50),
+        ),
+    ]
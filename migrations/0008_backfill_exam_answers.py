@@ -0,0 +1,26 @@
+# exam_app/migrations/0008_backfill_exam_answers.py
+# Converts the wrong_questions strings of older results into ExamAnswer rows, so the statistics page
+# (which reads the missed questions from ExamAnswer) keeps every user's missed questions after the upgrade.
+from django.db import migrations
+
+from exam_app.answer_backfill import backfill_exam_answers
+
+
+def fill_exam_answers(apps, schema_editor):
+    backfill_exam_answers(apps.get_model('exam_app', 'ExamResult'), apps.get_model('exam_app', 'ExamAnswer'))
+
+
+def remove_backfilled_answers(apps, schema_editor):
+    apps.get_model('exam_app', 'ExamAnswer').objects.filter(backfilled=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        # ExamAnswer (0004) with its backfilled flag (0005), ExamResult.mode (0006)
+        ('exam_app', '0007_question_bank'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_exam_answers, remove_backfilled_answers),
+    ]
@@ -2,8 +2,16 @@ from django.db import models
 from django.contrib.auth.models import User
 # exam_app/models.py
 
-from django.db import models
+import hashlib
+import re
+import struct
+import threading
+from datetime import timedelta
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Question(models.Model): 
     """
@@ -15,6 +23,38 @@ class Question(models.Model):
     # TextField datatype allows for long questions.
     text = models.TextField()
 
+    # Stable content key (SHA-1 of the normalised text and the bank) used by load_exam_data to match
+    # CSV rows to existing rows, so question IDs survive a re-import.
+    content_hash = models.CharField(max_length=40, unique=True, editable=False)
+
+    # The question bank (e.g. a licence class or language) the question was imported from; '' is the default bank.
+    # load_exam_data syncs and retires questions bank by bank.
+    bank = models.CharField(max_length=50, blank=True, default='', db_index=True)
+
+    # Questions removed from the CSV are retired instead of deleted, because
+    # ExamResult.wrong_questions keeps pointing at their IDs.
+    is_active = models.BooleanField(default=True)
+
+    # Optional group (e.g. "signs", "right of way") used by stratified exam draws (see sampling.py).
+    category = models.CharField(max_length=50, blank=True, default='')
+
+    @staticmethod
+    def make_key(text, bank=''):
+        """
+        Builds the content key of a question text.
+        Input: text (the question text), bank (optional bank name; the same text in two banks gets two keys)
+        Output: A 40 character hex digest; whitespace differences at the ends do not change it.
+        """
+        text = str(text).strip()
+        # The default bank keeps the plain text hash, so the keys of existing questions don't change
+        value = f"{bank}\x00{text}" if bank else text
+        return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+    def save(self, *args, **kwargs):
+        # Keep the key in sync when a question is created or edited (e.g. in the Admin panel).
+        self.content_hash = self.make_key(self.text, self.bank)
+        super().save(*args, **kwargs)
+
     # The __str__ method controls how this object looks in the Admin panel.
     # Instead of "Question object (1)", it will show the actual text.
     def __str__(self):
@@ -44,6 +84,55 @@ class Choice(models.Model):
     def __str__(self):
         return f"{self.text} (Correct: {self.is_correct})"
 
+class QuestionBankVersion(models.Model):
+    """
+    Single-row table holding the version number of the question bank.
+    Every change to the questions or choices (an import, or an edit in the Admin panel) increases it,
+    which tells the workers that their cached copy of the bank (see bank_cache.py) is out of date.
+    Input: version (increased by bump())
+    Output: The current version number, read by bank_cache.get_bank().
+    """
+    version = models.PositiveIntegerField(default=0)
+
+    # Automatically saves the time of the last change
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def current(cls):
+        """
+        Input: None
+        Output: The current bank version (0 if the bank was never changed).
+        """
+        row = cls.objects.filter(pk=1).values_list('version', flat=True).first()
+        return row or 0
+
+    @classmethod
+    def bump(cls):
+        """
+        Increases the bank version by one. Inside a transaction the new version only becomes visible on commit,
+        together with the changed questions.
+        Input: None
+        Output: None
+        """
+        # F() lets the database do the +1, so two imports at the same time can't lose an increment.
+        if not cls.objects.filter(pk=1).update(version=models.F('version') + 1, updated_at=timezone.now()):
+            cls.objects.get_or_create(pk=1, defaults={'version': 1})
+
+    def __str__(self):
+        return f"Question bank v{self.version}"
+
+class ExamResultQuerySet(models.QuerySet):
+    """
+    Filters shared by everything that reads the exam history.
+    """
+    def official(self):
+        """
+        Input: None
+        Output: The results of official exams only. Practice exams (see ExamAttempt.MODES) are drawn towards
+        the user's weak questions, so they are left out of the statistics, the item analysis and the rollups.
+        """
+        return self.filter(mode='exam')
+
 class ExamResult(models.Model):
     """
     Stores the history of a user's attempt at the exam.
@@ -64,8 +153,583 @@ class ExamResult(models.Model):
 
 ############################# TUNA YILMAZ ##############################################################################
 # # Stores IDs of incorrectly answered questions as a comma-separated string for analysis.
+# # Kept for compatibility; the same information (plus the chosen answers) is stored in ExamAnswer rows.
     wrong_questions = models.TextField(blank=True, null=True)
 
+    # Copied from ExamAttempt.mode: 'exam' for the official exam, 'practice' for a practice exam
+    mode = models.CharField(max_length=10, default='exam')
+
+    objects = ExamResultQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # A user's history is always read filtered by user and ordered by date (statistics, charts)
+            models.Index(fields=['user', 'date_taken'], name='exam_result_user_date'),
+            # ... or by id (latest result for the chart cache keys, report exports)
+            models.Index(fields=['user', 'id'], name='exam_result_user_id'),
+        ]
+
     # Returns a human-readable string for the object, making it easier to identify specific records in the Django Admin and during debugging.
     def __str__(self):
-        return f"{self.user.username} - {self.score} - {self.date_taken}"
\ No newline at end of file
+        return f"{self.user.username} - {self.score} - {self.date_taken}"
+
+class ExamAttempt(models.Model):
+    """
+    Server-side state of one exam in progress: which questions were drawn and until when it may be answered.
+    It is created once when the exam starts and never rewritten while the user refreshes the page;
+    the session only keeps its ID (exam_attempt_id), so opening the exam doesn't write the session table.
+    Input: user, question_ids (the drawn Question IDs, in their random order), duration (seconds)
+    Output: An ExamAttempt read with one primary-key lookup per request, which take_exam grades against.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exam_attempts')
+
+    started_at = models.DateTimeField()
+    # The server decides when the time is up, not the countdown in the browser
+    deadline = models.DateTimeField()
+
+    # The question IDs packed as little-endian unsigned 32-bit integers: 80 bytes for 20 questions,
+    # instead of a JSON list in the session that is encoded, signed and written again on every change.
+    # The byte order and width are fixed, so a row reads the same on every host (see pack_ids).
+    packed_question_ids = models.BinaryField()
+
+    # IDs above 2**32 - 1 don't fit in 4 bytes: such exams are stored with 8 bytes per ID after this marker byte.
+    # The 4-byte format always has a length divisible by 4, the wide one never does, so they can't be confused.
+    WIDE_IDS_MARKER = b'\x08'
+
+    # 'exam': the official exam, drawn uniformly; 'practice': weighted towards the user's weak questions
+    MODES = ('exam', 'practice')
+    mode = models.CharField(max_length=10, default='exam')
+
+    # Set when the exam is handed in; a second submission of the same attempt is refused
+    submitted_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def pack_ids(cls, question_ids):
+        """
+        Input: question_ids (list of Question IDs)
+        Output: The IDs as bytes: 4 bytes each (little-endian), or the wide marker and 8 bytes each
+        if an ID doesn't fit in 4 bytes. Raises ValueError for negative IDs.
+        """
+        question_ids = list(question_ids)
+        if any(question_id < 0 for question_id in question_ids):
+            raise ValueError("Question IDs can't be negative")
+        if all(question_id <= 0xFFFFFFFF for question_id in question_ids):
+            return struct.pack(f'<{len(question_ids)}I', *question_ids)
+        return cls.WIDE_IDS_MARKER + struct.pack(f'<{len(question_ids)}Q', *question_ids)
+
+    @classmethod
+    def unpack_ids(cls, packed):
+        """
+        Input: packed (bytes or memoryview, as returned by the database)
+        Output: The list of Question IDs in their original order.
+        """
+        packed = bytes(packed)
+        if len(packed) % 4 == 1 and packed[:1] == cls.WIDE_IDS_MARKER:
+            return list(struct.unpack(f'<{(len(packed) - 1) // 8}Q', packed[1:]))
+        return list(struct.unpack(f'<{len(packed) // 4}I', packed))
+
+    @property
+    def question_ids(self):
+        return self.unpack_ids(self.packed_question_ids)
+
+    @classmethod
+    def start(cls, user, question_ids, duration, started_at=None, mode='exam'):
+        """
+        Creates the attempt of a new exam.
+        Input: user, question_ids (the drawn IDs), duration (seconds), started_at (optional, defaults to now),
+        mode (one of MODES)
+        Output: The saved ExamAttempt.
+        """
+        started_at = started_at or timezone.now()
+        return cls.objects.create(
+            user=user,
+            started_at=started_at,
+            deadline=started_at + timedelta(seconds=duration),
+            packed_question_ids=cls.pack_ids(question_ids),
+            mode=mode,
+        )
+
+    def remaining_seconds(self, now=None):
+        # max(0, ...) prevents negative numbers once the deadline has passed
+        return max(0, int((self.deadline - (now or timezone.now())).total_seconds()))
+
+    def mark_submitted(self):
+        """
+        Claims the attempt for grading. The check and the update are one UPDATE statement,
+        so of two submissions sent at the same time (double click, two tabs) only one gets True.
+        Input: None
+        Output: True if this call handed the exam in, False if it was already submitted.
+        """
+        now = timezone.now()
+        claimed = ExamAttempt.objects.filter(pk=self.pk, submitted_at__isnull=True).update(submitted_at=now)
+        if claimed:
+            self.submitted_at = now
+        return bool(claimed)
+
+    def __str__(self):
+        return f"{self.user.username} - attempt {self.pk} - until {self.deadline}"
+
+class ExamAnswerQuerySet(models.QuerySet):
+    """
+    Database-side aggregations over the answers, used by the statistics pages.
+    """
+    def most_missed(self, user=None, limit=10):
+        """
+        Input: user (optional, only this user's answers), limit (number of questions)
+        Output: [{'question_id': ..., 'misses': ...}, ...] ordered by the number of misses, highest first.
+        """
+        answers = self.filter(is_correct=False)
+        if user is not None:
+            answers = answers.filter(user=user)
+        return answers.values('question_id').annotate(misses=models.Count('id')).order_by('-misses', 'question_id')[:limit]
+
+    def miss_rates(self):
+        """
+        Input: None
+        Output: [{'question_id', 'attempts', 'misses', 'miss_rate'}, ...] for every question that was ever answered.
+        Backfilled rows are left out: they only exist for wrong answers and would push every rate towards 1.
+        """
+        return self.filter(backfilled=False).values('question_id').annotate(
+            attempts=models.Count('id'),
+            misses=models.Count('id', filter=models.Q(is_correct=False)),
+        ).annotate(
+            miss_rate=models.ExpressionWrapper(
+                models.F('misses') * 1.0 / models.F('attempts'), output_field=models.FloatField()
+            )
+        ).order_by('-miss_rate', 'question_id')
+
+class ExamAnswer(models.Model):
+    """
+    One answered (or unanswered) question of one exam attempt: the normalized, indexed form of
+    ExamResult.wrong_questions, which also records the chosen answer.
+    Input: result (the attempt), user (copied from the result so per-user queries need no join),
+    question, choice (the chosen answer, None if not answered), is_correct.
+    Output: Rows that "most missed questions" and "miss rate per question" are computed from in the database.
+    """
+    result = models.ForeignKey(ExamResult, related_name='answers', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    # No database constraint on question/choice: like the IDs in wrong_questions, the history must survive
+    # a question being deleted (load_exam_data --replace) or an answer being removed from the CSV.
+    question = models.ForeignKey(Question, related_name='exam_answers', on_delete=models.DO_NOTHING, db_constraint=False)
+    choice = models.ForeignKey(Choice, related_name='+', on_delete=models.DO_NOTHING, db_constraint=False,
+                               null=True, blank=True)
+
+    is_correct = models.BooleanField()
+
+    # True for the rows backfill_exam_answers made from the wrong_questions string of an older result.
+    # The string only lists the wrong answers, so those results have no rows for their correct answers:
+    # they count for "most missed", but not for rates (miss_rates, the item analysis in analytics.py).
+    backfilled = models.BooleanField(default=False)
+
+    objects = ExamAnswerQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['result', 'question'], name='exam_answer_unique_question'),
+        ]
+        indexes = [
+            # "most-missed questions for this user"
+            models.Index(fields=['user', 'is_correct', 'question'], name='exam_answer_user_missed'),
+            # "global miss rate per question"
+            models.Index(fields=['question', 'is_correct'], name='exam_answer_question'),
+        ]
+
+    def __str__(self):
+        return f"Result {self.result_id} - Question {self.question_id} - {'Correct' if self.is_correct else 'Wrong'}"
+
+class UserExamStats(models.Model):
+    """
+    Running totals of one user's official exam results, updated every time one is created,
+    so the statistics page doesn't have to load and recompute the whole history. Practice exams are not counted.
+    The standard deviation is kept with Welford's online algorithm (mean and m2), which stays
+    numerically stable however many exams are added.
+    Input: user (OneToOne to User); filled by record() / add_score(), or by the rebuild_exam_stats command.
+    Output: exam_count, mean, std_dev, max_score, passed_count, success_rate and a score histogram in O(1).
+    """
+    # Scores go from 0 to 20, so the histogram has one bucket per possible score
+    HISTOGRAM_SIZE = 21
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='exam_stats')
+
+    # Number of exams, and the sum of all scores
+    exam_count = models.PositiveIntegerField(default=0)
+    score_sum = models.BigIntegerField(default=0)
+
+    # Welford's running mean and sum of squared differences from the mean
+    mean = models.FloatField(default=0.0)
+    m2 = models.FloatField(default=0.0)
+
+    max_score = models.IntegerField(default=0)
+    passed_count = models.PositiveIntegerField(default=0)
+
+    # [number of exams with score 0, with score 1, ..., with score 20]
+    histogram = models.JSONField(default=list)
+
+    # The last ExamResult counted, so a result is never added twice
+    last_result_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # The leaderboard reads the best averages first
+            models.Index(fields=['-mean', '-exam_count'], name='exam_stats_leaderboard'),
+        ]
+
+    def add_score(self, score, passed):
+        """
+        Adds one exam to the totals (does not save).
+        Input: score (number of correct answers), passed (True/False)
+        Output: None
+        """
+        self.exam_count += 1
+        self.score_sum += score
+        # Welford: update the mean, then m2 with the old and the new difference
+        delta = score - self.mean
+        self.mean += delta / self.exam_count
+        self.m2 += delta * (score - self.mean)
+        self.max_score = score if self.exam_count == 1 else max(self.max_score, score)
+        if passed:
+            self.passed_count += 1
+        if len(self.histogram) < self.HISTOGRAM_SIZE:
+            self.histogram = list(self.histogram) + [0] * (self.HISTOGRAM_SIZE - len(self.histogram))
+        self.histogram[min(max(score, 0), self.HISTOGRAM_SIZE - 1)] += 1
+
+    @property
+    def std_dev(self):
+        # Population standard deviation, the same as numpy.std()
+        return (self.m2 / self.exam_count) ** 0.5 if self.exam_count else 0.0
+
+    @property
+    def success_rate(self):
+        return self.passed_count / self.exam_count * 100 if self.exam_count else 0.0
+
+    @classmethod
+    def record(cls, result):
+        """
+        Adds a newly created ExamResult to its user's totals. The row is locked while it is updated,
+        so two exams finished at the same time are both counted.
+        Input: result (an official ExamResult that was just saved)
+        Output: The updated UserExamStats.
+        """
+        with transaction.atomic():
+            stats, _ = cls.objects.select_for_update().get_or_create(user_id=result.user_id)
+            if result.id > stats.last_result_id:
+                stats.add_score(result.score, result.passed)
+                stats.last_result_id = result.id
+                stats.save()
+        return stats
+
+    @classmethod
+    def rebuild_for_user(cls, user_id):
+        """
+        Recomputes a user's totals from their whole official ExamResult history
+        (used for results stored before this table existed, or by rebuild_exam_stats).
+        Input: user_id
+        Output: The saved UserExamStats.
+        """
+        with transaction.atomic():
+            stats, _ = cls.objects.select_for_update().get_or_create(user_id=user_id)
+            fresh = cls.from_history(user_id)
+            fresh.id = stats.id
+            fresh.save()
+        return fresh
+
+    @classmethod
+    def from_history(cls, user_id):
+        """
+        Computes a user's totals from their whole official ExamResult history, without saving them
+        (read-only callers like the report export use it for users without a UserExamStats row).
+        Input: user_id
+        Output: An unsaved UserExamStats.
+        """
+        stats = cls(user_id=user_id)
+        rows = ExamResult.objects.official().filter(user_id=user_id).order_by('id').values_list('id', 'score', 'passed')
+        for result_id, score, passed in rows.iterator():
+            stats.add_score(score, passed)
+            stats.last_result_id = result_id
+        return stats
+
+    @classmethod
+    def leaderboard(cls, limit=10, min_exams=5):
+        """
+        Input: limit (number of users), min_exams (users with fewer exams are not ranked, one lucky exam isn't a record)
+        Output: The UserExamStats (with their user) of the best average scores, more exams first on equal averages.
+        """
+        return cls.objects.filter(exam_count__gte=min_exams).select_related('user') \
+            .order_by('-mean', '-exam_count', 'user_id')[:limit]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.exam_count} exams - avg {self.mean:.2f}"
+
+# Finds the bytes of a bitset that have at least one bit set
+NONZERO_BYTE = re.compile(rb'[^\x00]')
+
+class UserMissSet(models.Model):
+    """
+    The questions a user currently gets wrong, as a bitset over the question IDs (bit n = question n),
+    for practice exams that target the user's weak questions (see sampling.draw_practice).
+    A question is added when it is answered wrong and removed when it is answered correctly again.
+    Input: user (OneToOne to User); updated by record() when an exam is graded.
+    Output: The missed question IDs with one row lookup, whatever the size of the history.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='miss_set')
+
+    # One bit per question ID: 125 KB for a bank of a million questions, a few bytes for a small one
+    bits = models.BinaryField(default=b'')
+
+    # Number of set bits, so empty sets are recognised without decoding
+    count = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def apply(self, answers):
+        """
+        Adds the wrong and removes the correct answers of one exam (does not save).
+        Input: answers (iterable of (question_id, is_correct))
+        Output: None
+        """
+        bits = bytearray(self.bits)
+        for question_id, is_correct in answers:
+            byte, bit = divmod(question_id, 8)
+            if is_correct:
+                if byte < len(bits):
+                    bits[byte] &= ~(1 << bit) & 0xFF
+            else:
+                if byte >= len(bits):
+                    bits.extend(bytes(byte + 1 - len(bits)))
+                bits[byte] |= 1 << bit
+        # Trailing zero bytes carry no information
+        self.bits = bytes(bits.rstrip(b'\x00'))
+        self.count = int.from_bytes(self.bits, 'little').bit_count()
+
+    @property
+    def question_ids(self):
+        # Only the non-zero bytes are looked at (found in C by the regular expression), so a sparse set decodes quickly
+        ids = []
+        for match in NONZERO_BYTE.finditer(bytes(self.bits)):
+            byte = match.group()[0]
+            ids.extend(match.start() * 8 + bit for bit in range(8) if byte >> bit & 1)
+        return ids
+
+    @classmethod
+    def record(cls, user_id, answers):
+        """
+        Updates a user's miss set with a graded exam. The row is locked while it is updated,
+        so two exams finished at the same time are both applied.
+        Input: user_id, answers (iterable of (question_id, is_correct))
+        Output: The saved UserMissSet.
+        """
+        with transaction.atomic():
+            miss_set, created = cls.objects.select_for_update().get_or_create(user_id=user_id)
+            if created:
+                # First exam since the table existed: start from the user's history (once)
+                miss_set.apply(cls._history(user_id))
+            miss_set.apply(answers)
+            miss_set.save()
+        return miss_set
+
+    @classmethod
+    def for_user(cls, user_id):
+        """
+        Input: user_id
+        Output: The user's UserMissSet, built from the ExamAnswer history (once) if it doesn't exist yet.
+        """
+        miss_set = cls.objects.filter(user_id=user_id).first()
+        if miss_set is None:
+            with transaction.atomic():
+                miss_set, created = cls.objects.select_for_update().get_or_create(user_id=user_id)
+                if created:
+                    miss_set.apply(cls._history(user_id))
+                    miss_set.save()
+        return miss_set
+
+    @staticmethod
+    def _history(user_id):
+        # The user's answers in the order they were given; the latest answer of a question decides
+        return ExamAnswer.objects.filter(user_id=user_id).order_by('result_id') \
+            .values_list('question_id', 'is_correct').iterator(chunk_size=2000)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.count} missed questions"
+
+class ExamRollup(models.Model):
+    """
+    Totals of all exams taken in one hour or one day, for the instructors' cohort dashboard.
+    Filled incrementally by the build_rollups command (see rollups.py), so the dashboard reads
+    a few hundred small rows instead of the whole ExamResult table.
+    Input: period ('hour' or 'day'), period_start (beginning of the hour / day in the current time zone), the totals.
+    Output: exam_count, pass_rate, mean, std_dev and the score histogram of the period.
+    """
+    PERIODS = ('hour', 'day')
+
+    period = models.CharField(max_length=4)
+    period_start = models.DateTimeField()
+
+    exam_count = models.PositiveIntegerField(default=0)
+    passed_count = models.PositiveIntegerField(default=0)
+    # Sum of the scores and of their squares: mean and standard deviation can be added up period by period
+    score_sum = models.BigIntegerField(default=0)
+    score_square_sum = models.BigIntegerField(default=0)
+
+    # [number of exams with score 0, with score 1, ..., with score 20], like UserExamStats.histogram
+    histogram = models.JSONField(default=list)
+
+    class Meta:
+        constraints = [
+            # Also the index of the dashboard query "the days (hours) since X, in order"
+            models.UniqueConstraint(fields=['period', 'period_start'], name='exam_rollup_period'),
+        ]
+
+    @property
+    def pass_rate(self):
+        return self.passed_count / self.exam_count * 100 if self.exam_count else 0.0
+
+    @property
+    def mean(self):
+        return self.score_sum / self.exam_count if self.exam_count else 0.0
+
+    @property
+    def std_dev(self):
+        # Population standard deviation from the sums (max(0, ...) absorbs rounding below zero)
+        if not self.exam_count:
+            return 0.0
+        return max(0.0, self.score_square_sum / self.exam_count - self.mean ** 2) ** 0.5
+
+    def __str__(self):
+        return f"{self.period} {self.period_start:%Y-%m-%d %H:%M} - {self.exam_count} exams"
+
+class ProcessingWatermark(models.Model):
+    """
+    Remembers how far a batch job has read a growing table, so the next run only reads the new rows.
+    Input: name (the job, e.g. 'question_stats'), last_id (the highest row ID already processed)
+    Output: One row per job, read with get() and moved forward with advance().
+    """
+    # Rows younger than this are left for the next run: a row with a lower ID may still be in an
+    # uncommitted transaction, and the watermark must never move past it.
+    SETTLE_SECONDS = 60
+
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+
+    # Automatically saves the time of the last run
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def get(cls, name):
+        """
+        Input: name (the job)
+        Output: The last processed ID of the job (0 if it never ran).
+        """
+        return cls.objects.filter(name=name).values_list('last_id', flat=True).first() or 0
+
+    @classmethod
+    def advance(cls, name, last_id):
+        """
+        Stores the new position of a job. Call it in the same transaction that saves the job's results,
+        so a failed run neither loses nor double counts rows.
+        Input: name (the job), last_id (the highest ID processed now; 0 resets the job)
+        Output: None
+        """
+        cls.objects.update_or_create(name=name, defaults={'last_id': last_id})
+
+    @classmethod
+    def lock(cls, name):
+        """
+        Locks the job's row until the end of the current transaction, so two runs of the same job
+        can't add the same rows twice. Must be called inside transaction.atomic().
+        Input: name (the job)
+        Output: The last processed ID of the job, as committed by the previous run.
+        """
+        cls.objects.get_or_create(name=name)
+        return cls.objects.select_for_update().get(name=name).last_id
+
+    def __str__(self):
+        return f"{self.name} - up to {self.last_id}"
+
+class QuestionStats(models.Model):
+    """
+    Item analysis of one question over all graded exam answers: how often it is missed,
+    how well it separates strong from weak candidates and which wrong answer attracts the most.
+    Filled incrementally by the analyze_items command (see analytics.py); the raw counts are stored
+    so that new answers can be added to them without reading the old ones again.
+    Input: question, answer counts split by whether the exam was passed, and the wrong answer counts per choice.
+    Output: miss_rate, discrimination and top_distractor, used to tune the bank loaded by load_exam_data.
+    """
+    # Like ExamAnswer, the statistics outlive a deleted question
+    question = models.OneToOneField(Question, primary_key=True, related_name='item_stats',
+                                    on_delete=models.DO_NOTHING, db_constraint=False)
+
+    attempts = models.PositiveIntegerField(default=0)
+    misses = models.PositiveIntegerField(default=0)
+
+    # Candidates who passed the exam (score >= 16) are the "strong" group, the others the "weak" group
+    passed_attempts = models.PositiveIntegerField(default=0)
+    passed_correct = models.PositiveIntegerField(default=0)
+    failed_attempts = models.PositiveIntegerField(default=0)
+    failed_correct = models.PositiveIntegerField(default=0)
+
+    # Share of wrong or missing answers (0 .. 1)
+    miss_rate = models.FloatField(default=0.0)
+
+    # Correct rate of the strong group minus the correct rate of the weak group (-1 .. 1).
+    # Near 0 or negative means the question doesn't measure what the exam measures. None until both groups answered it.
+    discrimination = models.FloatField(null=True, blank=True)
+
+    # {choice id: number of times it was picked as a wrong answer}
+    distractor_counts = models.JSONField(default=dict)
+    # The most picked wrong answer (None if nobody picked a wrong answer)
+    top_distractor_id = models.BigIntegerField(null=True, blank=True)
+    top_distractor_count = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # The analysis view lists the hardest / least discriminating questions first
+            models.Index(fields=['miss_rate'], name='question_stats_miss_rate'),
+            models.Index(fields=['discrimination'], name='question_stats_discrimination'),
+        ]
+
+    def refresh_rates(self):
+        """
+        Recomputes the derived fields from the counts (does not save).
+        Input: None
+        Output: None
+        """
+        self.miss_rate = self.misses / self.attempts if self.attempts else 0.0
+        if self.passed_attempts and self.failed_attempts:
+            self.discrimination = (self.passed_correct / self.passed_attempts
+                                   - self.failed_correct / self.failed_attempts)
+        else:
+            self.discrimination = None
+        if self.distractor_counts:
+            # Ties go to the lower choice ID, so the result doesn't depend on the dict order
+            choice_id, count = max(self.distractor_counts.items(), key=lambda item: (item[1], -int(item[0])))
+            self.top_distractor_id, self.top_distractor_count = int(choice_id), count
+        else:
+            self.top_distractor_id, self.top_distractor_count = None, 0
+
+    def __str__(self):
+        return f"Question {self.question_id} - miss rate {self.miss_rate:.2f}"
+
+# Edits made one by one (e.g. in the Admin panel) also invalidate the cached bank.
+# bulk_create()/update() don't send this signal, so load_exam_data bumps the version itself.
+@receiver(post_save, sender=Question)
+@receiver(post_save, sender=Choice)
+def bump_bank_version(sender, **kwargs):
+    QuestionBankVersion.bump()
+
+# The delete() call whose rows were last reported, per thread
+_last_delete = threading.local()
+
+# Deleted questions and choices (in the Admin panel, or load_exam_data --replace through the cascade)
+# must not be served from the cache either. One delete() sends a signal for every deleted row
+# (a question and all of its choices), all with the same origin, so the version is bumped once per call.
+@receiver(post_delete, sender=Question)
+@receiver(post_delete, sender=Choice)
+def bump_bank_version_on_delete(sender, origin=None, **kwargs):
+    # A reference to the origin is kept (not its id()), so a later delete() can't be mistaken for it
+    if origin is not None and getattr(_last_delete, 'origin', None) is origin:
+        return
+    _last_delete.origin = origin
+    QuestionBankVersion.bump()
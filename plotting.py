@@ -0,0 +1,92 @@
+# exam_app/plotting.py
+"""
+Matplotlib drawing of the statistics charts.
+
+This module imports matplotlib at load time, so it must only be imported lazily (inside the
+function that needs it, see charts.get_user_chart), never from views.py or another module that
+every worker loads at startup. Rendering uses matplotlib's object-oriented Figure API with the
+Agg canvas: it keeps no global pyplot state, so it is safe in threaded workers and nothing has to
+be closed afterwards.
+"""
+import io
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+def render_chart(chart_type, scores, passed_count):
+    """
+    Draws one statistics chart.
+    Input: chart_type ('pie', 'line' or 'histogram'), scores (list of scores in the order the exams were taken),
+    passed_count (number of passed exams).
+    Output: The chart as PNG bytes.
+    """
+    fig = Figure(figsize=(8, 5))  # For the figure size adjustment
+    FigureCanvasAgg(fig)  # Anti-Grain Geometry => Creation of an image without window
+    ax = fig.add_subplot()
+
+    if chart_type == 'histogram':
+        # Create a histogram to visualize the distribution of exam scores
+        # Bins = number of intervals on a histogram | alpha = colour intensity
+        ax.hist(scores, bins=5, color='skyblue', edgecolor='black', alpha=0.8)
+        ax.set_title("Score Distribution Across Exams", fontsize=14)
+        ax.set_xlabel("Score (Out of 20)")
+        ax.set_ylabel("Number of Exams")
+
+    elif chart_type == 'line':
+        # Create a line graph for the changes of the scores of the user over the tests taken
+        trial_numbers = list(range(1, len(scores) + 1))
+        ax.plot(trial_numbers, scores, marker='o', color='purple', linewidth=2)
+        ax.set_title("Your Progress Over Time", fontsize=14)
+        ax.set_xlabel("Number of Exams")
+        ax.set_ylabel("Score")
+        ax.grid(True, linestyle='--', alpha=0.6)
+
+    else:
+        # Create a pie chart for the comparison of Passing vs. Failing counts
+        # 'autopct' formats the percentage labels as a float with 1 digit after the decimal and a % sign.
+        ax.pie([passed_count, len(scores) - passed_count], labels=['Pass', 'Fail'],
+               autopct='%1.1f%%', colors=['green', 'red'], startangle=140)
+        ax.set_title("Overall Pass/Fail Ratio", fontsize=14)
+
+    # Adjust layout to make sure titles and labels don't get cut off
+    fig.tight_layout()
+
+    # Rendering and exporting the plot into an in-memory buffer in PNG format (no disk I/O)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+def render_cohort_chart(chart_type, labels, values):
+    """
+    Draws one chart of the cohort dashboard.
+    Input: chart_type ('pass_rate' or 'distribution'), labels (x axis: period labels, or the scores 0..20),
+    values (pass rates in percent, or number of exams per score).
+    Output: The chart as PNG bytes.
+    """
+    fig = Figure(figsize=(10, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    if chart_type == 'distribution':
+        # Bar per possible score; the pass mark (16) is drawn as a dashed line
+        ax.bar(labels, values, color='skyblue', edgecolor='black')
+        ax.axvline(15.5, color='red', linestyle='--', linewidth=1)
+        ax.set_title("Score Distribution of All Exams", fontsize=14)
+        ax.set_xlabel("Score (Out of 20)")
+        ax.set_ylabel("Number of Exams")
+    else:
+        ax.plot(labels, values, marker='o', color='green', linewidth=2)
+        ax.set_ylim(0, 100)
+        ax.set_title("Pass Rate per Period", fontsize=14)
+        ax.set_ylabel("Pass Rate (%)")
+        ax.grid(True, linestyle='--', alpha=0.6)
+        # Period labels are long, keep them readable
+        ax.tick_params(axis='x', labelrotation=45)
+
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
@@ -0,0 +1,134 @@
+# exam_app/rollups.py
+"""
+Materialized hourly and daily totals of all official exams (ExamRollup), for the cohort dashboard.
+
+build_rollups() reads the exam results added since the last run (a ProcessingWatermark) in ID ranges
+of CHUNK_SIZE. The database groups every range by (hour, score, passed), so only a few hundred small rows
+come back however many exams were taken. Those rows are added to the hour and the day they belong to.
+The dashboard then reads one row per day (or hour) instead of scanning ExamResult.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import ExamResult, ExamRollup, ProcessingWatermark, UserExamStats
+
+# Name of the job in ProcessingWatermark
+WATERMARK_NAME = 'exam_rollups'
+
+# Number of ExamResult IDs grouped per query
+CHUNK_SIZE = 50000
+
+TOTAL_FIELDS = ['exam_count', 'passed_count', 'score_sum', 'score_square_sum']
+
+
+def _grouped(first_id, last_id):
+    # (hour, score, passed, number of exams) for the official results of an ID range, grouped by the database
+    return ExamResult.objects.official().filter(id__gte=first_id, id__lte=last_id) \
+        .annotate(hour=TruncHour('date_taken')).values_list('hour', 'score', 'passed') \
+        .annotate(exams=Count('id')).order_by()
+
+
+def _add(totals, key, score, passed, exams):
+    total = totals.get(key)
+    if total is None:
+        total = totals[key] = [0, 0, 0, 0, [0] * UserExamStats.HISTOGRAM_SIZE]
+    total[0] += exams
+    total[1] += exams if passed else 0
+    total[2] += score * exams
+    total[3] += score * score * exams
+    total[4][min(max(score, 0), UserExamStats.HISTOGRAM_SIZE - 1)] += exams
+
+
+def build_rollups(backfill=False, chunk_size=CHUNK_SIZE, batch_size=1000):
+    """
+    Adds the exams taken since the last run to the hourly and daily rollups.
+    Input: backfill (True: delete the rollups and rebuild them from the whole history),
+    chunk_size (ExamResult IDs per query), batch_size (ExamRollup rows per write).
+    Output: A dict with the number of results read, rollup rows written and the new watermark.
+    """
+    start_after = 0 if backfill else ProcessingWatermark.get(WATERMARK_NAME)
+    settled = timezone.now() - datetime.timedelta(seconds=ProcessingWatermark.SETTLE_SECONDS)
+    end = ExamResult.objects.filter(id__gt=start_after, date_taken__lte=settled) \
+        .order_by('-id').values_list('id', flat=True).first()
+    if end is None:
+        return {'results': 0, 'rows': 0, 'watermark': start_after}
+
+    # 1. {(period, period start): [exam_count, passed_count, score_sum, score_square_sum, histogram]}
+    totals = {}
+    results = 0
+    for first_id in range(start_after + 1, end + 1, chunk_size):
+        for hour, score, passed, exams in _grouped(first_id, min(end, first_id + chunk_size - 1)):
+            results += exams
+            _add(totals, ('hour', hour), score, passed, exams)
+            # TruncHour gives the hour in the current time zone, so midnight of that day is the day's start
+            _add(totals, ('day', hour.replace(hour=0)), score, passed, exams)
+
+    # 2. Add them to the stored rows and save them together with the watermark
+    with transaction.atomic():
+        # The watermark row is locked: two runs at the same time would count the same exams twice
+        current = ProcessingWatermark.lock(WATERMARK_NAME)
+        if not backfill and current != start_after:
+            raise RuntimeError(f"Another run moved the watermark from {start_after} to {current}; run again.")
+        existing = {}
+        if backfill:
+            ExamRollup.objects.all().delete()
+        else:
+            for period in ExamRollup.PERIODS:
+                starts = [start for p, start in totals if p == period]
+                for rollup in ExamRollup.objects.select_for_update().filter(period=period, period_start__in=starts):
+                    existing[(period, rollup.period_start)] = rollup
+
+        rows = []
+        for (period, start), (exam_count, passed_count, score_sum, square_sum, histogram) in totals.items():
+            rollup = existing.get((period, start)) or ExamRollup(period=period, period_start=start)
+            rollup.exam_count += exam_count
+            rollup.passed_count += passed_count
+            rollup.score_sum += score_sum
+            rollup.score_square_sum += square_sum
+            stored = list(rollup.histogram) + [0] * (UserExamStats.HISTOGRAM_SIZE - len(rollup.histogram))
+            rollup.histogram = [a + b for a, b in zip(stored, histogram)]
+            rows.append(rollup)
+        ExamRollup.objects.bulk_create(
+            rows, batch_size=batch_size, update_conflicts=True, unique_fields=['period', 'period_start'],
+            update_fields=TOTAL_FIELDS + ['histogram'],
+        )
+        ProcessingWatermark.advance(WATERMARK_NAME, end)
+
+    return {'results': results, 'rows': len(rows), 'watermark': end}
+
+
+def period_since(period, count):
+    """
+    Input: period ('hour' or 'day'), count (number of periods to show, including the current one)
+    Output: The start of the first period, in the current time zone.
+    """
+    now = timezone.localtime() if settings.USE_TZ else timezone.now()
+    start = now.replace(minute=0, second=0, microsecond=0)
+    if period == 'day':
+        return start.replace(hour=0) - datetime.timedelta(days=count - 1)
+    return start - datetime.timedelta(hours=count - 1)
+
+
+def series(period, since):
+    """
+    Input: period ('hour' or 'day'), since (start of the first period)
+    Output: The ExamRollup rows of the period type from since on, oldest first (periods without exams have no row).
+    """
+    return list(ExamRollup.objects.filter(period=period, period_start__gte=since).order_by('period_start'))
+
+
+def distribution(rollups):
+    """
+    Input: rollups (ExamRollup rows)
+    Output: The combined score histogram [exams with score 0, ..., exams with score 20].
+    """
+    combined = [0] * UserExamStats.HISTOGRAM_SIZE
+    for rollup in rollups:
+        for score, exams in enumerate(rollup.histogram[:UserExamStats.HISTOGRAM_SIZE]):
+            combined[score] += exams
+    return combined
@@ -0,0 +1,139 @@
+# exam_app/sampling.py
+"""
+Random exam assembly from the cached question bank.
+
+The IDs of the active questions are kept as an array per question bank (Question.bank) in the
+bank snapshot (bank_cache.py), which is rebuilt only when the bank version changes. An exam is
+drawn from one bank only (bank_name, '' for the default bank), never from a mix of banks. Drawing an exam is then random.sample()
+over that array: it picks k distinct positions in O(k) time, whatever the size of the bank,
+and no query is made.
+
+Practice exams (draw_practice) are weighted towards the user's missed questions (UserMissSet,
+one row lookup) and the globally hardest questions (QuestionStats, kept in the Django cache).
+The official exam always stays uniform.
+"""
+import random
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .bank_cache import get_bank
+from .models import QuestionStats
+
+# Number of questions in one exam
+EXAM_QUESTION_COUNT = 20
+
+# Share of a practice exam drawn from the user's missed questions, and from the globally hard ones.
+# Quotas that can't be filled (few misses) go to the next pool; the rest is drawn uniformly.
+PRACTICE_MIX = {'missed': 0.5, 'hard': 0.25}
+
+# The hardest questions by miss rate (with at least HARD_MIN_ATTEMPTS answers) form the "hard" pool
+HARD_POOL_SIZE = 200
+HARD_MIN_ATTEMPTS = 20
+
+
+def _resolve(bank, bank_name):
+    # The given snapshot, or the cached snapshot of the named bank
+    if bank is None:
+        bank = get_bank(bank_name)
+        if bank is None:
+            raise ValueError(f"The question bank {bank_name!r} has no active questions")
+    return bank
+
+
+def draw_exam(k=EXAM_QUESTION_COUNT, seed=None, bank=None, bank_name=''):
+    """
+    Picks k distinct active questions of one bank uniformly at random.
+    Input: k (number of questions; fewer are returned if the bank is smaller),
+    seed (optional; the same seed and bank version always give the same exam),
+    bank (optional QuestionBank, the cached one of bank_name by default), bank_name (Question.bank, '' by default).
+    Output: A list of Question IDs in exam order.
+    """
+    bank = _resolve(bank, bank_name)
+    rng = random.Random(seed) if seed is not None else random
+    # (Use min to avoid errors if we have fewer than k questions loaded)
+    return rng.sample(bank.active_ids, min(len(bank.active_ids), k))
+
+
+def draw_stratified(quotas, seed=None, bank=None, fill_to=None, bank_name=''):
+    """
+    Picks questions per category, e.g. {"signs": 5, "right of way": 10} for an exam blueprint.
+    Input: quotas ({category: number of questions}), seed (optional, see draw_exam),
+    bank (optional QuestionBank), fill_to (optional total; when the categories can't provide enough
+    questions, the rest is drawn uniformly from the other active questions), bank_name (see draw_exam).
+    Output: A list of distinct Question IDs, category by category in the order of quotas, then shuffled.
+    """
+    bank = _resolve(bank, bank_name)
+    rng = random.Random(seed) if seed is not None else random
+    picked = []
+    for category, count in quotas.items():
+        pool = bank.strata.get(category, ())
+        picked.extend(rng.sample(pool, min(len(pool), count)))
+
+    if fill_to is not None:
+        _fill_uniform(picked, fill_to, rng, bank)
+
+    rng.shuffle(picked)
+    return picked
+
+
+def _fill_uniform(picked, total, rng, bank):
+    # Adds uniformly drawn active questions to picked (in place) until it has total questions.
+    # Rejection sampling stays O(k) as long as the picked questions are a small part of the bank.
+    chosen = set(picked)
+    missing = min(total - len(picked), len(bank.active_ids) - len(chosen))
+    while missing > 0:
+        question_id = bank.active_ids[rng.randrange(len(bank.active_ids))]
+        if question_id not in chosen:
+            chosen.add(question_id)
+            picked.append(question_id)
+            missing -= 1
+
+
+def _is_active(bank, question_id):
+    # active_ids is built in ID order, so a binary search answers "can it be asked in this bank?" without a set of the bank
+    index = bisect_left(bank.active_ids, question_id)
+    return index < len(bank.active_ids) and bank.active_ids[index] == question_id
+
+
+def get_hard_question_ids():
+    """
+    Input: None
+    Output: The IDs of the HARD_POOL_SIZE questions with the highest miss rate (see analytics.py),
+    read from the Django cache; the query runs at most once per EXAM_HARD_POOL_TIMEOUT seconds (default 1 hour).
+    """
+    cache = caches[getattr(settings, 'EXAM_BANK_CACHE', 'default')]
+    ids = cache.get('exam_hard_questions')
+    if ids is None:
+        ids = list(QuestionStats.objects.filter(attempts__gte=HARD_MIN_ATTEMPTS)
+                   .order_by('-miss_rate', 'question_id').values_list('question_id', flat=True)[:HARD_POOL_SIZE])
+        cache.set('exam_hard_questions', ids, timeout=getattr(settings, 'EXAM_HARD_POOL_TIMEOUT', 60 * 60))
+    return ids
+
+
+def draw_practice(missed_ids, hard_ids=(), k=EXAM_QUESTION_COUNT, seed=None, bank=None, mix=PRACTICE_MIX,
+                  bank_name=''):
+    """
+    Picks k distinct active questions of one bank for a practice exam, weighted towards weak questions.
+    Input: missed_ids (the user's missed question IDs, e.g. UserMissSet.question_ids),
+    hard_ids (globally hard question IDs, e.g. get_hard_question_ids()), k, seed (optional, see draw_exam),
+    bank (optional QuestionBank), mix (share of the exam from each pool, see PRACTICE_MIX), bank_name (see draw_exam).
+    Output: A list of Question IDs in random order. Retired questions and questions of other banks are skipped.
+    """
+    bank = _resolve(bank, bank_name)
+    rng = random.Random(seed) if seed is not None else random
+    picked = []
+    quota = 0
+    for pool, share in ((missed_ids, mix.get('missed', 0)), (hard_ids, mix.get('hard', 0))):
+        # What the previous pool couldn't fill is added to this one's quota
+        quota += round(k * share)
+        chosen = set(picked)
+        candidates = [qid for qid in pool if qid not in chosen and _is_active(bank, qid)]
+        taken = rng.sample(candidates, min(len(candidates), quota, k - len(picked)))
+        picked.extend(taken)
+        quota -= len(taken)
+
+    _fill_uniform(picked, k, rng, bank)
+    rng.shuffle(picked)
+    return picked
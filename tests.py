@@ -0,0 +1,399 @@
+# exam_app/tests.py
+"""
+Regression tests of the exam engine. Run them with: python manage.py test exam_app
+"""
+import json
+import datetime
+import os
+import statistics
+import tempfile
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import exports
+from .bank_cache import invalidate_local
+from .bank_files import find_banks
+from .models import Question, Choice, QuestionBankVersion, ExamAttempt, ExamResult, UserExamStats, ExamAnswer, QuestionStats
+from .sampling import draw_exam, draw_practice
+from .views import get_exam_questions, grade_submission
+
+
+def make_bank(question_count=30, choice_count=4, bank=''):
+    """
+    Creates a question bank with bulk_create (like load_exam_data), the first choice of every question is correct.
+    Input: question_count, choice_count (choices per question), bank (Question.bank)
+    Output: The list of Question IDs.
+    """
+    texts = [f"Question {n}?" for n in range(question_count)]
+    Question.objects.bulk_create([Question(text=text, content_hash=Question.make_key(text, bank), bank=bank)
+                                  for text in texts])
+    ids = list(Question.objects.filter(bank=bank).order_by('id').values_list('id', flat=True))
+    Choice.objects.bulk_create([
+        Choice(question_id=question_id, text=f"Answer {n}", is_correct=n == 0)
+        for question_id in ids for n in range(choice_count)
+    ])
+    QuestionBankVersion.bump()
+    return ids
+
+
+class BankCacheTestCase(TestCase):
+    """
+    Every test starts without a cached bank: the bank versions start again at 1 in every test,
+    so a bank cached by an earlier test would be served for the same version number.
+    """
+    def setUp(self):
+        caches['default'].clear()
+        invalidate_local()
+        self.addCleanup(invalidate_local)
+
+
+# The bank version is compared with the database on every request, so the query count doesn't depend on timing
+@override_settings(EXAM_BANK_VERSION_CHECK=0)
+class ExamPageTests(BankCacheTestCase):
+    """
+    The exam page loads its questions and choices from the cached bank, in the order of the ExamAttempt.
+    """
+    def setUp(self):
+        super().setUp()
+        self.question_ids = make_bank()
+        self.user = User.objects.create_user('candidate', password='secret')
+        self.client.force_login(self.user)
+
+    def test_refresh_query_count_does_not_depend_on_the_questions(self):
+        # The first visit draws the exam and builds the bank cache
+        self.client.get(reverse('take_exam'))
+        # A refresh: session, user, the ExamAttempt (one primary-key lookup) and the bank version.
+        # The questions and their choices come from the cache: no query per question or per choice.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('take_exam'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['questions']), 20)
+
+    def test_questions_are_shown_in_attempt_order(self):
+        self.client.get(reverse('take_exam'))
+        attempt = ExamAttempt.objects.get(user=self.user)
+        response = self.client.get(reverse('take_exam'))
+        self.assertEqual([q.id for q in response.context['questions']], attempt.question_ids)
+        # Every question is shown with its own choices
+        for question in response.context['questions']:
+            self.assertEqual(len(question.choices), 4)
+            self.assertEqual({choice.id for choice in question.choices},
+                             set(Choice.objects.filter(question_id=question.id).values_list('id', flat=True)))
+
+    def test_get_exam_questions_keeps_the_given_order(self):
+        order = list(reversed(self.question_ids[:20]))
+        self.assertEqual([q.id for q in get_exam_questions(order)], order)
+
+
+def submit_exam(client, user, correct_count):
+    """
+    Opens the exam page and hands the exam in with the first correct_count questions answered correctly
+    and the others wrong.
+    Input: client (logged in as user), user, correct_count
+    Output: The response of the submission.
+    """
+    client.get(reverse('take_exam'))
+    attempt = ExamAttempt.objects.get(user=user, submitted_at__isnull=True)
+    post = {}
+    for n, question_id in enumerate(attempt.question_ids):
+        choice = Choice.objects.filter(question_id=question_id, is_correct=n < correct_count).order_by('id').first()
+        post[f'question_{question_id}'] = str(choice.id)
+    return client.post(reverse('take_exam'), post)
+
+
+@override_settings(EXAM_BANK_VERSION_CHECK=0)
+class UserExamStatsTests(BankCacheTestCase):
+    """
+    The totals kept at grading time give the same numbers as a calculation over the whole ExamResult history.
+    """
+    SCORES = [20, 12, 16, 5, 18, 16, 0]
+
+    def setUp(self):
+        super().setUp()
+        make_bank()
+        self.user = User.objects.create_user('candidate', password='secret')
+        self.client.force_login(self.user)
+
+    def assertMatchesHistory(self, stats):
+        results = list(ExamResult.objects.filter(user=self.user).order_by('id'))
+        scores = [result.score for result in results]
+        self.assertEqual(stats.exam_count, len(results))
+        self.assertAlmostEqual(stats.mean, statistics.fmean(scores))
+        # Population standard deviation, like numpy.std()
+        self.assertAlmostEqual(stats.std_dev, statistics.pstdev(scores))
+        self.assertEqual(stats.max_score, max(scores))
+        self.assertAlmostEqual(stats.success_rate, sum(result.passed for result in results) / len(results) * 100)
+        self.assertEqual(stats.histogram, [scores.count(score) for score in range(UserExamStats.HISTOGRAM_SIZE)])
+        self.assertEqual(stats.last_result_id, results[-1].id)
+
+    def test_totals_match_the_history(self):
+        for score in self.SCORES:
+            submit_exam(self.client, self.user, score)
+        self.assertEqual(list(ExamResult.objects.filter(user=self.user).order_by('id').values_list('score', flat=True)),
+                         self.SCORES)
+        self.assertMatchesHistory(UserExamStats.objects.get(user=self.user))
+
+    def test_practice_exams_are_not_counted(self):
+        submit_exam(self.client, self.user, 18)
+        recorded = UserExamStats.objects.get(user=self.user)
+
+        self.client.get(reverse('take_exam') + '?mode=practice')
+        attempt = ExamAttempt.objects.get(user=self.user, submitted_at__isnull=True)
+        self.assertEqual(attempt.mode, 'practice')
+        self.client.post(reverse('take_exam'), {})
+
+        practice = ExamResult.objects.get(mode='practice')
+        self.assertEqual(practice.score, 0)
+        stats = UserExamStats.objects.get(user=self.user)
+        self.assertEqual((stats.exam_count, stats.mean, stats.last_result_id),
+                         (recorded.exam_count, recorded.mean, recorded.last_result_id))
+        # Neither the item analysis nor the backfill reads practice results
+        self.assertFalse(ExamAnswer.objects.filter(result=practice).exists())
+        self.assertEqual(UserExamStats.from_history(self.user.id).exam_count, 1)
+
+    def test_practice_link_does_not_replace_an_exam_in_progress(self):
+        self.client.get(reverse('take_exam'))
+        response = self.client.get(reverse('take_exam') + '?mode=practice')
+        self.assertFalse(response.context['practice'])
+        self.assertEqual(ExamAttempt.objects.filter(user=self.user).count(), 1)
+        self.assertContains(response, "You already have an exam in progress")
+
+    def test_rebuild_gives_the_same_totals(self):
+        for score in self.SCORES:
+            submit_exam(self.client, self.user, score)
+        recorded = UserExamStats.objects.get(user=self.user)
+        rebuilt = UserExamStats.rebuild_for_user(self.user.id)
+        self.assertMatchesHistory(rebuilt)
+        self.assertAlmostEqual(rebuilt.m2, recorded.m2)
+
+
+class ExamAttemptTests(SimpleTestCase):
+    """
+    The packed question IDs have the same bytes on every host and keep IDs of any size.
+    """
+    def test_ids_are_packed_little_endian(self):
+        self.assertEqual(ExamAttempt.pack_ids([1, 258]), b'\x01\x00\x00\x00\x02\x01\x00\x00')
+
+    def test_round_trip(self):
+        for ids in ([], [5, 3, 9], [2 ** 32 - 1, 1], [2 ** 32, 7], [2 ** 40] * 20):
+            self.assertEqual(ExamAttempt.unpack_ids(memoryview(ExamAttempt.pack_ids(ids))), ids)
+
+    def test_negative_ids_are_rejected(self):
+        with self.assertRaises(ValueError):
+            ExamAttempt.pack_ids([3, -1])
+
+
+class GradingTests(SimpleTestCase):
+    """
+    grade_submission only grades the questions assigned to the exam.
+    """
+    def test_unassigned_questions_are_ignored(self):
+        answer_key = {1: (11,), 2: (21,), 3: (31,)}
+        post = {'question_1': '11', 'question_2': '22', 'question_99': '5', 'question_abc': '1'}
+        score, wrong_question_ids, answers = grade_submission(post, [1, 2, 3], answer_key=answer_key)
+        self.assertEqual(score, 1)
+        # 99 and "abc" were not assigned: they are not stored as missed questions; 3 was not answered
+        self.assertEqual(wrong_question_ids, ['2', '3'])
+        self.assertEqual(answers, [(1, 11, True), (2, 22, False), (3, None, False)])
+
+
+class BankVersionTests(TestCase):
+    """
+    Changes to the questions and choices invalidate the cached bank.
+    """
+    def test_delete_bumps_the_version_once(self):
+        ids = make_bank(question_count=3)
+        version = QuestionBankVersion.current()
+        # The question and its four choices are deleted by one call: one bump
+        Question.objects.get(id=ids[0]).delete()
+        self.assertEqual(QuestionBankVersion.current(), version + 1)
+        Choice.objects.filter(question_id=ids[1]).delete()
+        self.assertEqual(QuestionBankVersion.current(), version + 2)
+
+
+class ExportTests(TestCase):
+    """
+    The all-users export reads the totals chunk by chunk and never writes.
+    """
+    def test_all_reports_prefetch_stats_without_writing(self):
+        for n, scores in enumerate([[18, 12], [16], [20, 4, 9]]):
+            user = User.objects.create_user(f'candidate{n}')
+            for score in scores:
+                result = ExamResult.objects.create(user=user, score=score, passed=score >= 16)
+                # The last user has no totals yet (results from before UserExamStats existed)
+                if n < 2:
+                    UserExamStats.record(result)
+
+        # The users of the chunk, their totals, their results, the missing user's history, the empty next chunk
+        with self.assertNumQueries(5):
+            lines = [json.loads(line) for chunk in exports.iter_all_reports('jsonl') for line in chunk.splitlines()]
+        self.assertEqual(UserExamStats.objects.count(), 2)
+
+        summaries = [line for line in lines if line['type'] == 'summary']
+        self.assertEqual([summary['total_exams'] for summary in summaries], [2, 1, 3])
+        self.assertAlmostEqual(summaries[2]['average_score'], 11.0)
+        self.assertEqual(sum(line['type'] == 'result' for line in lines), 6)
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN is SQLite's")
+class QueryPlanTests(TestCase):
+    """
+    The hot-path queries are planned on the indexes of migration 0003, not as full table scans.
+    """
+    def test_user_history_uses_the_user_date_index(self):
+        plan = ExamResult.objects.filter(user_id=1).order_by('date_taken').explain()
+        self.assertIn('exam_result_user_date', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_latest_result_is_read_from_a_user_index(self):
+        plan = ExamResult.objects.filter(user_id=1).order_by('-id')[:1].explain()
+        # SQLite stores the rowid in every index, so the foreign key index on user_id serves (user, id) as well
+        # as exam_result_user_id; either way the order must come from the index, not from a sort
+        self.assertRegex(plan, r'INDEX (exam_result_user_id|exam_app_examresult_user_id_\w+)')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_choices_of_a_question_are_searched_not_scanned(self):
+        # The foreign key index on question_id serves "the choices of question X"
+        plan = Choice.objects.filter(question_id=1, is_correct=True).explain()
+        self.assertIn('SEARCH', plan)
+        self.assertNotRegex(plan, r'\bSCAN\b')
+
+    def test_check_query_plans_command_passes(self):
+        # Raises CommandError if any hot-path query scans a table or sorts without an index
+        call_command('check_query_plans', stdout=StringIO())
+
+
+class ItemAnalysisTests(TestCase):
+    """
+    The item analysis counts the graded answers, not the incomplete rows of backfill_exam_answers.
+    """
+    def test_backfilled_rows_are_skipped(self):
+        from .analytics import refresh_question_stats
+
+        q1, q2, q3 = make_bank(question_count=3)
+        user = User.objects.create_user('candidate')
+        wrong = Choice.objects.filter(question_id=q3, is_correct=False).first()
+        graded = ExamResult.objects.create(user=user, score=2, passed=False)
+        ExamAnswer.objects.bulk_create([
+            ExamAnswer(result=graded, user=user, question_id=q1, choice=Choice.objects.get(question_id=q1, is_correct=True),
+                       is_correct=True),
+            ExamAnswer(result=graded, user=user, question_id=q2, choice=Choice.objects.get(question_id=q2, is_correct=True),
+                       is_correct=True),
+            ExamAnswer(result=graded, user=user, question_id=q3, choice=wrong, is_correct=False),
+        ])
+        # An older result converted from its wrong_questions string: only q1 was wrong
+        older = ExamResult.objects.create(user=user, score=2, passed=False)
+        ExamAnswer.objects.create(result=older, user=user, question_id=q1, is_correct=False, backfilled=True)
+        # Results younger than SETTLE_SECONDS are left for the next run
+        ExamResult.objects.update(date_taken=timezone.now() - datetime.timedelta(minutes=5))
+
+        refresh_question_stats()
+        stats = QuestionStats.objects.in_bulk()
+        self.assertEqual((stats[q1].attempts, stats[q1].misses), (1, 0))
+        self.assertEqual(stats[q1].miss_rate, 0.0)
+        self.assertEqual((stats[q3].attempts, stats[q3].misses), (1, 1))
+        self.assertEqual(stats[q3].top_distractor_id, wrong.id)
+        self.assertEqual({row['question_id']: row['attempts'] for row in ExamAnswer.objects.miss_rates()},
+                         {q1: 1, q2: 1, q3: 1})
+
+
+class AnswerBackfillTests(TestCase):
+    """
+    Older results (only a wrong_questions string) get their missed questions as ExamAnswer rows.
+    """
+    def test_wrong_questions_become_backfilled_answers(self):
+        from .answer_backfill import backfill_exam_answers
+
+        user = User.objects.create_user('candidate')
+        older = ExamResult.objects.create(user=user, score=17, passed=True, wrong_questions='3,5,x,5')
+        ExamResult.objects.create(user=user, score=18, passed=True, wrong_questions='7', mode='practice')
+
+        self.assertEqual(backfill_exam_answers(ExamResult, ExamAnswer), (1, 2, 1))
+        self.assertEqual(sorted(ExamAnswer.objects.values_list('result_id', 'question_id', 'is_correct', 'backfilled')),
+                         [(older.id, 3, False, True), (older.id, 5, False, True)])
+        # Converted results are not converted twice
+        self.assertEqual(backfill_exam_answers(ExamResult, ExamAnswer), (0, 0, 0))
+
+
+class SyncBankTests(TestCase):
+    """
+    Re-importing a bank keeps a choice ID only for the exact same answer text.
+    """
+    def test_replaced_answer_is_a_new_choice(self):
+        from .management.commands.load_exam_data import sync_bank
+
+        text = "Who has the right of way?"
+        key = Question.make_key(text)
+        sync_bank([{key: (text, [("Yield to traffic from the right", True), ("The faster car", False)])}], 100)
+        kept = Choice.objects.get(text="Yield to traffic from the right")
+        replaced = Choice.objects.get(text="The faster car")
+
+        sync_bank([{key: (text, [("Yield to traffic from the right", True), ("Brand new wrong answer", False)])}], 100)
+        self.assertTrue(Choice.objects.filter(id=kept.id, text=kept.text, is_correct=True).exists())
+        self.assertFalse(Choice.objects.filter(id=replaced.id).exists())
+        self.assertNotEqual(Choice.objects.get(text="Brand new wrong answer").id, replaced.id)
+
+
+@override_settings(EXAM_BANK_VERSION_CHECK=0)
+class QuestionBankTests(BankCacheTestCase):
+    """
+    Banks imported side by side (licence classes, languages) are never mixed in one exam.
+    """
+    def setUp(self):
+        super().setUp()
+        self.banks = {name: set(make_bank(question_count=25, bank=name)) for name in ('', 'class-a', 'class-b')}
+        self.user = User.objects.create_user('candidate', password='secret')
+        self.client.force_login(self.user)
+
+    def test_exam_is_drawn_from_the_chosen_bank(self):
+        self.client.get(reverse('take_exam') + '?bank=class-b')
+        attempt = ExamAttempt.objects.get(user=self.user)
+        self.assertEqual(len(attempt.question_ids), 20)
+        self.assertLessEqual(set(attempt.question_ids), self.banks['class-b'])
+
+    def test_default_bank_and_practice_stay_in_their_bank(self):
+        self.assertLessEqual(set(draw_exam(20)), self.banks[''])
+        # Missed questions of another bank are not asked in a practice exam of this one
+        missed = sorted(self.banks['class-a'])[:10] + sorted(self.banks['class-b'])[:10]
+        self.assertLessEqual(set(draw_practice(missed, (), 20, bank_name='class-b')), self.banks['class-b'])
+
+    def test_unknown_bank_is_not_found(self):
+        response = self.client.get(reverse('take_exam') + '?bank=class-z')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(ExamAttempt.objects.exists())
+
+
+class BankFilesTests(SimpleTestCase):
+    """
+    Bank names must fit in Question.bank.
+    """
+    def test_long_bank_names_are_rejected(self):
+        with tempfile.TemporaryDirectory() as root:
+            for name in ('class-a', 'x' * 51):
+                os.mkdir(os.path.join(root, name))
+                with open(os.path.join(root, name, 'final_exam_data.csv'), 'w', encoding='utf-8') as f:
+                    f.write("question_text;answer_text;is_correct\nQ?;A;1\n")
+            with self.assertRaisesMessage(ValueError, 'x' * 51):
+                find_banks(root)
+            self.assertEqual([name for name, _ in find_banks(root, max_name_length=60)], ['class-a', 'x' * 51])
+
+    def test_directories_that_are_not_a_bank_are_returned_for_the_report(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.mkdir(os.path.join(root, 'class-a'))
+            with open(os.path.join(root, 'class-a', 'final_exam_data.csv'), 'w', encoding='utf-8') as f:
+                f.write("question_text;answer_text;is_correct\nQ?;A;1\n")
+            # One questions file and two answers files: no valid layout
+            os.mkdir(os.path.join(root, 'class-b'))
+            for file_name in ('questions.csv', 'answers_1.csv', 'answers_2.csv'):
+                open(os.path.join(root, 'class-b', file_name), 'w').close()
+            banks = dict(find_banks(root))
+            self.assertEqual(sorted(banks), ['class-a', 'class-b'])
+            self.assertIsNone(banks['class-b'])
@@ -0,0 +1,16 @@
+# exam_app/urls.py
+
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('exam/', views.take_exam, name='take_exam'),
+    path('statistics/', views.user_statistics_view, name='user_stats'),
+    # Chart images are served on their own URL, so the browser can cache them (ETag / Last-Modified)
+    path('statistics/chart/<str:chart_type>.png', views.user_chart_view, name='user_chart'),
+    path('statistics/export/all/', views.export_all_reports_view, name='export_all_reports'),
+    path('statistics/timings/', views.timing_stats_view, name='timing_stats'),
+    path('statistics/items/', views.item_analysis_view, name='item_analysis'),
+    path('statistics/cohort/', views.cohort_dashboard_view, name='cohort_dashboard'),
+    path('statistics/cohort/chart/<str:chart_type>.png', views.cohort_chart_view, name='cohort_chart'),
+]
@@ -2,20 +2,30 @@
 from django.shortcuts import render # The connecter between HTML files and python data
 from django.contrib.auth.decorators import login_required # Forces the user to be logged in before accessing the exam
 from django.contrib import messages # Warning messages to the user
-from django.http import HttpResponse # Needed for exporting statistics to .txt
-from .models import Question, ExamResult, Choice # Importing the database models
-import random # The random module to select random questions
-import time # Needed for the exam timer
-import io # io Activation for data management for Tuna
+from django.http import HttpResponse, Http404, JsonResponse, StreamingHttpResponse # Needed for exporting statistics files
+from django.contrib.admin.views.decorators import staff_member_required # Restricts the bulk export to administrators
+from django.views.decorators.http import require_http_methods
+from django.urls import reverse # Builds the URL of the chart image
+from django.utils.cache import get_conditional_response # Answers "304 Not Modified" for unchanged charts
+from django.utils.http import http_date, quote_etag
+from .models import Question, ExamResult, Choice, UserExamStats, ExamAnswer, ExamAttempt, QuestionStats, ProcessingWatermark, UserMissSet # Importing the database models
+from .bank_cache import get_bank # Cached copy of the question bank (texts, choices and answer key)
+from .sampling import EXAM_QUESTION_COUNT, draw_exam, draw_practice, get_hard_question_ids # Random question selection from the cached bank
+from . import exports # Streaming report downloads
+from . import rollups # Hourly / daily exam totals for the cohort dashboard
+from .instrumentation import get_sink, span # Named timing spans (no-op unless EXAM_TIMING_ENABLED)
+from .charts import CHART_TYPES, DEFAULT_CHART_TYPE, COHORT_CHART_TYPES, get_user_chart, get_cohort_chart, latest_result, schedule_prerender # Cached statistics charts
 import base64 # base64 Activation for encoding the chart for HTML for Tuna
-import matplotlib.pyplot as plt # Matplotlib Activation for creating stats charts for Tuna
+import calendar # Converts the date of the latest result for the Last-Modified header
 from django.shortcuts import render, redirect  # Redirect activation for the Response Showing from Server
+from django.db import transaction
 from django.db.models import Avg
-import pandas as pd # Pandas Activation for Data Frame Creation for Tuna
-import numpy as np # Numpy Activation for Statistics Calculation Tuna
+from django.utils import timezone # Timezone-aware "now" for the exam deadline
 import datetime
 
 EXAM_DURATION = 20 * 60  # 20 minutes (in seconds)
+# Extra seconds a submission may arrive after the deadline (the automatic submission when the timer runs out)
+EXAM_SUBMIT_GRACE = 30
 
 
 @login_required  # This decorator forces the user to login before seeing this page.
@@ -23,103 +33,250 @@ def take_exam(request):
     """
     Displays the exam form and handles the submission. 
     The exam is limited to 20 min and includes analytics for missed questions.
-    Input: GET request to show the exam, POST request to submit answers.
+    Input: GET request to show the exam (?mode=practice starts a practice exam that focuses on the questions
+    the user got wrong, ?bank=<name> draws it from that question bank instead of the default one),
+    POST request to submit answers.
     Output: Renders the exam page with questions and timer, or processes the submission and redirects to the statistics page.
     """
 
     # ---- TIMER ----
     #timer is written in JavaScript code and runs in the browser to update the countdown every second. 
-    # Django provides the starting time and exam start time stays the same is session until submission, and JavaScript handles displaying the timer 
-    # Try to get the exam start time from the session
-    start_time = request.session.get("exam_start_time")
-    # If this is the first time the user opens the exam, start the timer
-    if start_time is None:
-        start_time = time.time()
-        request.session["exam_start_time"] = start_time
+    # The exam's questions and deadline are stored once in an ExamAttempt row when the exam starts;
+    # the session only holds its ID, so refreshing the page reads one row by primary key and writes nothing.
+    # The deadline is checked here on the server, JavaScript only handles displaying the timer
 # for html file in exam.app The time decrease functionality is located on line 48 within the tick() function, where the variable remaining is decremented by one (remaining--;) every second via the recursive setTimeout call on line 49.-->
+    with span("attempt"):
+        attempt = get_current_attempt(request)
 
-    elapsed_time = time.time() - start_time  # how much time passed since the exam started
-    # Calculate how many seconds are still left; max(0, ...) prevents negative numbers
-    remaining_seconds = max(0, EXAM_DURATION - int(elapsed_time))
-    
     # --- SCORING LOGIC --- (POST request)
     if request.method == "POST":
         ### Handling user input and calculating score
+        if attempt is None:
+            # No exam in progress (e.g. the form was sent again after it was already submitted)
+            messages.warning(request, "This exam was already submitted.")
+            return redirect('user_stats')
 
+        now = timezone.now()
+        late = now > attempt.deadline + datetime.timedelta(seconds=EXAM_SUBMIT_GRACE)
         # If the user submitted after time expired, show a warning
-        if elapsed_time >= EXAM_DURATION:
+        if late:
+            messages.warning(request, "Time is up! Answers sent after the deadline were not accepted.")
+        elif now >= attempt.deadline:
             messages.warning(request, "Time is up! Exam submitted automatically.")
 
-        score = 0
         # --- Tuna's FEATURE: List to track failed questions ---
-        wrong_question_ids = []
-
-        # We loop through every item submitted in the form
-        for key, value in request.POST.items():
-            if key.startswith('question_'):
-                # Extract Question ID to track analytics
-                question_id = key.replace('question_', '')
-                
-                try:
-                    # The value is the ID of the chosen answer (Choice ID)
-                    choice_id = int(value)
-                    ## Check if this choice is correct in the DB
-                    ## and ensure the choice actually belongs to the question submitted
-                    selected_choice = Choice.objects.get(id=choice_id, question_id=question_id)
-                    
-                    if selected_choice.is_correct:
-                        score += 1
-                    else:
-                        # --- Tuna's FEATURE: Save the ID of the missed question ---
-                        wrong_question_ids.append(str(question_id))
-                
-                except (ValueError, Choice.DoesNotExist):
-                    # If user tampers with the HTML value (e.g., submits "abc" or an invalid ID),
-                    # treat it as a wrong answer to prevent a 500 Server Error crash.
-                    wrong_question_ids.append(str(question_id))
+        # All submitted (question, choice) pairs are checked against the exam's questions in one query.
+        # The answer key comes from the cached bank, so grading doesn't query the database.
+        # Answers that arrive after the deadline (plus the grace period for the automatic submission) are not accepted.
+        with span("grading"):
+            bank = get_bank()
+            score, wrong_question_ids, answers = grade_submission({} if late else request.POST, attempt.question_ids,
+                                                                  answer_key=bank.answer_key)
         
         # Calculate Pass/Fail (Need 16 out of 20)
         passed = score >= 16
 
         # --- COMBINED SAVE: Including your wrong_questions field ---
-        ExamResult.objects.create(
-            user=request.user,
-            score=score,
-            passed=passed,
-            wrong_questions=",".join(wrong_question_ids)  # Stores missed IDs as a string
-        )
+        # The result and the user's statistics totals are saved together (both or neither).
+        with span("save"), transaction.atomic():
+            # Only the first submission of an attempt is graded (double click, two tabs, browser "resend")
+            if not attempt.mark_submitted():
+                request.session.pop("exam_attempt_id", None)
+                messages.warning(request, "This exam was already submitted.")
+                return redirect('user_stats')
+            result = ExamResult.objects.create(
+                user=request.user,
+                score=score,
+                passed=passed,
+                wrong_questions=",".join(wrong_question_ids),  # Stores missed IDs as a string
+                mode=attempt.mode,
+            )
+            if result.mode == "exam":
+                # Practice exams are drawn towards weak questions: they would lower the user's statistics
+                # and the leaderboard, and skew the item analysis and the cohort rollups, so only
+                # official exams are counted there.
+                UserExamStats.record(result)
+                # One indexed row per question with the chosen answer, for the "most missed" statistics
+                ExamAnswer.objects.bulk_create(build_exam_answers(result, answers, bank))
+            # Keep the user's set of missed questions current; a practice exam is where they are answered again
+            UserMissSet.record(request.user.id, [(question_id, is_correct) for question_id, _, is_correct in answers])
+        if result.mode == "exam":
+            # Draw the new statistics charts in the background while the user is redirected (if enabled in settings)
+            transaction.on_commit(lambda: schedule_prerender(request.user.id, result.id))
 
         # Clear session so next exam starts fresh next time
-        request.session.pop("exam_start_time", None)
-        request.session.pop("exam_question_ids", None)
+        request.session.pop("exam_attempt_id", None)
 
         # --- Tuna's FEATURE: Automatic redirect to statistics page ---
         return redirect('user_stats')
 
     # --- DISPLAY LOGIC --- (GET request)
-    # Manage random question selection per session
-    if "exam_question_ids" not in request.session:
-        ## Because of the ForeignKey in the Choice model, we get the choices for each question,
-        ## with no need to load the choices again here.
-        
-        # 1. Get all question IDs
-        all_ids = list(Question.objects.values_list("id", flat=True))
+    # Manage random question selection per attempt
+    requested_mode = "practice" if request.GET.get("mode") == "practice" else "exam"
+    if attempt is not None and attempt.mode != requested_mode:
+        # The exam in progress is shown again: it has to be finished (or run out) before another one starts,
+        # otherwise an official exam could be dropped and restarted through the practice link
+        messages.info(request, f"You already have {'a practice' if attempt.mode == 'practice' else 'an'} exam "
+                               f"in progress. Finish it before starting a new one.")
+    if attempt is None:
+        # Banks hold different licence classes or languages: an exam is drawn from one bank only
+        bank = get_bank(request.GET.get("bank", ""))
+        if bank is None:
+            raise Http404("Unknown question bank")
+        # Pick 20 random IDs from the cached array of the bank's active question IDs
+        # (retired questions stay in the database for the history, but are not asked anymore).
+        # This takes the same time for 100 or 1,000,000 questions and doesn't query the database.
+        with span("sampling"):
+            if requested_mode == "practice":
+                # Practice: weighted towards the user's missed and the globally hard questions of the bank
+                # (one row lookup and one cache read, the history is not scanned)
+                random_ids = draw_practice(UserMissSet.for_user(request.user.id).question_ids,
+                                           get_hard_question_ids(), EXAM_QUESTION_COUNT, bank=bank)
+            else:
+                # The official exam stays uniform
+                random_ids = draw_exam(EXAM_QUESTION_COUNT, bank=bank)
+            attempt = ExamAttempt.start(request.user, random_ids, EXAM_DURATION, mode=requested_mode)
+        # The only session write of the whole exam
+        request.session["exam_attempt_id"] = attempt.id
 
-        # 2. Pick 20 random IDs
-        # (Use min to avoid errors if we have fewer than 20 questions loaded)   
-        random_ids = random.sample(all_ids, min(len(all_ids), 20))
-        request.session["exam_question_ids"] = random_ids
+    # 3. Fetch the actual Question objects
+    with span("questions"):
+        questions = get_exam_questions(attempt.question_ids)
 
-    else:
-        random_ids = request.session["exam_question_ids"]
+    with span("render"):
+        return render(request, "exam_app/exam.html", {
+            "questions": questions,
+            "remaining_seconds": attempt.remaining_seconds(),
+            "practice": attempt.mode == "practice",
+        })
 
-    # 3. Fetch the actual Question objects
-    questions = Question.objects.filter(id__in=random_ids)
+def get_current_attempt(request):
+    """
+    Finds the exam the user is taking.
+    Input: request (with exam_attempt_id in the session once an exam was started)
+    Output: The user's unsubmitted ExamAttempt (one primary-key lookup), or None if there is none.
+    Sessions from before ExamAttempt existed (exam_start_time / exam_question_ids) are converted once.
+    """
+    attempt_id = request.session.get("exam_attempt_id")
+    if attempt_id is not None:
+        # Filtering by user too: an ID from someone else's session never matches
+        attempt = ExamAttempt.objects.filter(pk=attempt_id, user=request.user, submitted_at__isnull=True).first()
+        if attempt is None:
+            request.session.pop("exam_attempt_id", None)
+        return attempt
+
+    legacy_ids = request.session.pop("exam_question_ids", None)
+    legacy_start = request.session.pop("exam_start_time", None)
+    if not legacy_ids:
+        return None
+    started_at = datetime.datetime.fromtimestamp(legacy_start, tz=datetime.timezone.utc) if legacy_start else None
+    attempt = ExamAttempt.start(request.user, legacy_ids, EXAM_DURATION, started_at=started_at)
+    request.session["exam_attempt_id"] = attempt.id
+    return attempt
+
+def get_exam_questions(question_ids):
+    """
+    Looks up the questions of an exam and their choices in the cached question bank.
+    Input: question_ids (the list of Question IDs of the ExamAttempt, in their random order)
+    Output: A list of CachedQuestion tuples (id, text, choices) in the same order as question_ids.
+    No query is made unless the bank version changed (see bank_cache.get_bank).
+    """
+    questions = get_bank().questions
+    return [questions[qid] for qid in question_ids if qid in questions]
 
-    return render(request, "exam_app/exam.html", {
-        "questions": questions,
-        "remaining_seconds": remaining_seconds
-    })
+def grade_submission(post_data, assigned_ids, answer_key=None):
+    """
+    Grades a submitted exam form with a single database query (or none when an answer key is given).
+    Input: post_data (request.POST, with 'question_<question id>' = '<choice id>' fields),
+    assigned_ids (the question IDs of the ExamAttempt), answer_key (optional {question_id: (correct choice ids)} mapping).
+    Output: A (score, wrong_question_ids, answers) tuple. wrong_question_ids holds the question IDs as strings,
+    in the order they were submitted, followed by the assigned questions that were not answered.
+    answers is a list of (question_id, chosen choice id or None, is_correct) for every assigned question.
+    Fields of questions that were not assigned to this exam are ignored (a crafted form can't add them to
+    wrong_questions), and answers that don't belong to their question count as wrong.
+    """
+    # 1. Parse the form: keep the raw question id string, it is what wrong_questions stores
+    submitted = []  # [(question id string, question id or None, choice id or None)]
+    for key, value in post_data.items():
+        if key.startswith('question_'):
+            question_key = key.replace('question_', '')
+            try:
+                question_id = int(question_key)
+            except ValueError:
+                question_id = None
+            try:
+                # The value is the ID of the chosen answer (Choice ID)
+                choice_id = int(value)
+            except (TypeError, ValueError):
+                # If user tampers with the HTML value (e.g., submits "abc"), it is simply a wrong answer.
+                choice_id = None
+            submitted.append((question_key, question_id, choice_id))
+
+    # Without a list of assigned questions (None), the submitted questions are trusted.
+    if assigned_ids:
+        assigned = set(assigned_ids)
+    else:
+        assigned = {question_id for _, question_id, _ in submitted if question_id is not None}
+
+    # 2. Only pairs that belong to this exam are worth checking
+    candidates = {(question_id, choice_id) for _, question_id, choice_id in submitted
+                  if question_id in assigned and choice_id is not None}
+
+    if not candidates:
+        correct_pairs = set()
+    elif answer_key is None:
+        ## One query for the whole form: which of the chosen choices are correct
+        ## and actually belong to the question they were submitted for?
+        correct_pairs = set(Choice.objects.filter(
+            id__in={choice_id for _, choice_id in candidates},
+            question_id__in={question_id for question_id, _ in candidates},
+            is_correct=True,
+        ).values_list('question_id', 'id'))
+    else:
+        correct_pairs = {(question_id, choice_id) for question_id, choice_id in candidates
+                         if choice_id in answer_key.get(question_id, ())}
+
+    # 3. Score in the order of the form, then add the assigned questions that were left out
+    score = 0
+    wrong_question_ids = []
+    answers = []
+    answered = set()
+    for question_key, question_id, choice_id in submitted:
+        if assigned_ids and question_id not in assigned:
+            continue  # Only the questions of this exam are graded
+        if question_id is not None and question_id in answered:
+            continue  # 'question_7' and 'question_07' are the same question, it is graded once
+        answered.add(question_id)
+        is_correct = (question_id, choice_id) in correct_pairs
+        if is_correct:
+            score += 1
+        else:
+            # --- Tuna's FEATURE: Save the ID of the missed question ---
+            wrong_question_ids.append(question_key if question_id is None else str(question_id))
+        if question_id in assigned:
+            answers.append((question_id, choice_id, is_correct))
+    for question_id in assigned_ids or ():
+        if question_id not in answered:
+            wrong_question_ids.append(str(question_id))
+            answers.append((question_id, None, False))
+
+    return score, wrong_question_ids, answers
+
+def build_exam_answers(result, answers, bank):
+    """
+    Turns the graded answers into ExamAnswer rows (not saved yet).
+    Input: result (the saved ExamResult), answers (from grade_submission), bank (the cached QuestionBank).
+    Output: A list of ExamAnswer objects. A chosen choice that does not belong to its question
+    (a tampered form) is stored as None, the answer is wrong either way.
+    """
+    rows = []
+    for question_id, choice_id, is_correct in answers:
+        question = bank.questions.get(question_id)
+        if question is None or all(choice.id != choice_id for choice in question.choices):
+            choice_id = None
+        rows.append(ExamAnswer(result=result, user_id=result.user_id, question_id=question_id,
+                               choice_id=choice_id, is_correct=is_correct))
+    return rows
 
 ########################################################################################################################
 ############################################ TUNA YILMAZ ###############################################################
@@ -134,179 +291,300 @@ def user_statistics_view(request):
         chart and histograms for the user performance evaluation.
 
         LOGIC FLOW:
-        - DATA (1.A-C): Grabs ExamResult records. Uses Pandas 'errors=coerce' to turn
-          corrupted scores into NaNs, then NumPy to calculate Average, Std Dev (Consistency),
-          and Max Score safely.
-        - DOWNLOAD (2): If 'download' is in GET, it generates a structured .txt report
-          on the fly and returns it as an attachment.
-        - MISTAKES (3): Extracts wrong question IDs from strings. Uses a set() to avoid
-          duplicates and returns an empty list [] if no errors exist to prevent HTML crashes.
-        - VISUALS (4-6): Uses Matplotlib (Agg backend) to draw Pie, Line, or Histograms.
-          Encodes the result into a Base64 string for direct HTML rendering without disk I/O.
+        - DATA (1.A-C): Reads the user's UserExamStats totals (count, Welford mean/std,
+          max, passed count), which take_exam updates with every new result, so Average,
+          Std Dev (Consistency) and Max Score cost one query whatever the history size.
+        - DOWNLOAD (2): If 'download' is in GET, it streams a structured .txt (or CSV / JSON Lines)
+          report as an attachment, line by line while the results are read (see exports.py).
+        - MISTAKES (3): Selects the questions the user missed from the indexed ExamAnswer
+          table with one query (an empty queryset if there are no mistakes).
+        - VISUALS (4-6): Takes the Pie, Line, or Histogram PNG from the chart cache (charts.py),
+          which only draws it with Matplotlib when the user has a new result. Passes both
+          its URL (user_chart_view) and a Base64 string for direct HTML rendering.
         - OUTPUT (7): Renders 'user_stats.html' with all calculated metrics and the
           encoded chart.
     """
 
     # --- 1. DATA PROCESSING ---
-    # 1.A Data Importation from the ExamResult class in exam_app/models.py filtered by the user and ordered by the date
-    user_data = ExamResult.objects.filter(user=request.user).order_by('date_taken')
+    # 1.A The user's newest ExamResult from exam_app/models.py: (id, date), or None
+    with span("data_load"):
+        latest = latest_result(request.user.id)
 
     # 1... A Small Error Handling Against Absent User Data
-    if not user_data.exists():
+    if latest is None:
         return render(request, "exam_app/user_stats.html", {
             "no_data": True,
             "message": "You haven't taken any exams yet. Finish an exam to see your statistics!"
-        }) # If no data exists for user_data give the output as above for teh whole page of statistics
-
-    # 1.B Creation of Data from the Imported Data through Pandas according to the # of passes, scores and dates
-    df = pd.DataFrame(list(user_data.values('score', 'passed', 'date_taken')))
-
-    # 1.C NumPy for the calculation of Descriptive Statistics
-    df['score'] = pd.to_numeric(df['score'], errors='coerce') # creation of a series - array in Pd - object for Numpy via Pandas
-    # if non-numeric values encountered converted into NaN
-    scores_array = df['score'].dropna().to_numpy() # Creation of a fully numeric array with dropped NaN values
-    # Advanced Metrics for the Continuous Data
-    total_exams = len(df) # Object for # of data points in data
-    avg_score = np.mean(scores_array) if len(scores_array) > 0 else 0 # Average calculation
-    std_dev = np.std(scores_array) if len(scores_array) > 0 else 0 # Consistency metric (Standard Deviation) calculation
-    max_score = np.max(scores_array) if len(scores_array) > 0 else 0 # Personal best score finding in data
+        }) # If no results exist for the user give the output as above for teh whole page of statistics
+
+    # 1.B The totals are kept up to date by take_exam (UserExamStats.record), so they are read in O(1)
+    # instead of loading the whole history into a DataFrame. If they don't include the newest result yet
+    # (e.g. results from before the table existed), they are rebuilt once from the history.
+    with span("metrics"):
+        stats = UserExamStats.objects.filter(user=request.user).first()
+        if stats is None or stats.last_result_id != latest[0]:
+            stats = UserExamStats.rebuild_for_user(request.user.id)
+
+    # 1.C Descriptive Statistics (the same values numpy.mean / numpy.std / numpy.max gave)
+    total_exams = stats.exam_count # Object for # of data points in data
+    avg_score = stats.mean # Average
+    std_dev = stats.std_dev # Consistency metric (population Standard Deviation)
+    max_score = stats.max_score # Personal best score
 
     # Consistency Level based on Standard Deviation
     consistency_score = "High" if std_dev < 2 else "Medium" if std_dev < 4 else "Low"
     # Determination of the constituency score according to the state of the standard deviation
 
     # Categorical Data: Pass vs Fail Percentages
-    passed_count = df['passed'].sum()
-    success_rate = (passed_count / total_exams) * 100 if total_exams > 0 else 0
-    # Determination of the success_rate according to the percentage of the passed_counts
+    success_rate = stats.success_rate
+    # Determination of the success_rate according to the percentage of the passed exams
 
     # --- 2. DOWNLOAD REPORT ---
-    if 'download' in request.GET: # if user requests "download" through GET download the report file as a .txt
-        # Step 2.A: Create the header and basic stats list
-        # First part of the report with the # of exams taken, average, standard deviation, succes rate, consistency
-        report_lines = [
-            f"EXAM PERFORMANCE REPORT - {request.user.username.upper()}",
-            "=" * 45, # separators
-            f"Total Exams Taken: {total_exams}",
-            f"Average Score:     {avg_score:.2f} / 20", # .2f => float with 2 decimal points
-            f"Standard Deviation: {std_dev:.2f}", # .2f => float with 2 decimal points
-            f"Success Rate:      %{success_rate:.1f}", # .1f => float with 1 decimal point
-            f"Consistency Level: {consistency_score}", # consistency_score => a qualitative data calculated from std_dev
-            "-" * 45, # separators
-            "\nDETAILED EXAM HISTORY:" # Title of the second part of the exam
-        ]
-
-        # Step 2.B: Add detailed logs using List Comprehension (Your logic!)
-        # List of strings for the user for each of the taken exam records in the database
-        log_entries = [
-            f"- Date: {res.date_taken.strftime('%Y-%m-%d')} | Score: {res.score}/20 | Status: {'Passed' if res.passed else 'Failed'}"
-            # All data presented with their corresponding metrics | strftime to convert into %Y-%m-%d format
-            for res in user_data]
-
-        # Step 2.C: Combine all lines into the main list
-        report_lines.extend(log_entries) # append the log_entries list to the end of report_lines
-        report_lines.append("\n" + "=" * 45) # seperator
-        report_lines.append("END OF REPORT") # terminal of the report
-
-        # Step 2.D: Join all lines with a newline character to create one large string
-        final_report_text = "\n".join(report_lines)
-        # log_entries appended report_lines list is separated line by line through "\n".join method
-
-        # Step 2.E: Create the HTTP Response for file download
-        # 'text/plain' informs the browser about the content of file as a text file but not an HTML file
-        response = HttpResponse(final_report_text, content_type='text/plain') # a text - not an HTML - is response for HTML
-
-        # 'attachment' downloads to PC instead of displaying on HTML
-        filename = f"Performance_Report_{request.user.username}.txt" # setting up the filename for the download file
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        # attachment is the response type that activates saves as rather than display the object = filename here
-
-        return response
-
-    # --- 3. IDENTIFY MISTAKES: Analyze wrong question IDs from previous exams ---
-    all_wrong_ids = [] # creation of a list for all the wrong answers of a user so far
-
-    for res in user_data:
-        # check if there are any recorded wrong questions for this exam
-        if res.wrong_questions:
-            # IDs are stored as a string, split them by comma and add to list.
-            all_wrong_ids.extend(res.wrong_questions.split(','))
-
-    # set() function to remove duplicate IDs from the list  from all_wrong_ids and give a pure list = all_wrong_ids
-    unique_wrong_ids = set(all_wrong_ids)
-    if unique_wrong_ids:
-    # fetch question objects from the database according to the unique IDs and give them as list failed_questions
-        failed_questions = Question.objects.filter(id__in=unique_wrong_ids)
-    else: failed_questions = []
+    if 'download' in request.GET: # if user requests "download" through GET download the report file
+        # ?format=txt (default) | csv | jsonl, optional ?after=<result id>&limit=<n> to download page by page
+        return report_download_response(request, exports.iter_user_report(
+            request.user, stats, _export_format(request),
+            after=_int_param(request, 'after'), limit=_int_param(request, 'limit'),
+        ), f"Performance_Report_{request.user.username}")
+
+    # --- 3. IDENTIFY MISTAKES: The questions this user answered wrong in previous exams ---
+    # The ExamAnswer table is indexed on (user, is_correct, question), so the database returns the
+    # distinct missed questions directly, without splitting the wrong_questions strings in Python.
+    # (Results stored before ExamAnswer existed are converted by migration 0008, see answer_backfill.py.)
+    missed_ids = ExamAnswer.objects.filter(user=request.user, is_correct=False).values('question_id')
+    failed_questions = Question.objects.filter(id__in=missed_ids)
 
     # --- 4. PREPARE CHART: Determine the visualization type from the URL query parameters. ---
-    chart_type = request.GET.get('chart_type', 'pie')
-    # If no type is specified it defaults to 'pie'.
-    failed_count = total_exams - passed_count # calculation of failed_count from passed_count and tota_exams
-    # passed_count was already calculated at 1.C as a metric
-    scores = df['score'].tolist() # listing of pandas data frame for matplotlib
-
-    # --- 5. DATA VISUALIZATION: Generate charts using Matplotlib ---
-    # Usage of 'Agg' backend to run in a non-GUI environment (ideal for web servers)
-    plt.switch_backend('Agg') # Anti-Grain Geometry => Creation of an image without window
-    plt.clf()  # Clear the current figure to prevent overlapping plots
-    plt.figure(figsize=(8, 5))  # For the figure size adjustment
-
-    if chart_type == 'histogram': # If histogram is chosen on the HTML file
-        # Create a histogram to visualize the distribution of exam scores from scores object
-        # 'bins' define the intervals, 'alpha' adds slight transparency
-        plt.hist(scores, bins=5, color='skyblue', edgecolor='black', alpha=0.8)
-        # Bins = number of intervals on a histogram | alpha = colour intensity
-        plt.title("Score Distribution Across Exams", fontsize=14)
-        plt.xlabel("Score (Out of 20)")
-        plt.ylabel("Number of Exams")
-
-    elif chart_type == 'line':
-        # Create a line graph for the changes of success rates of the user over the tests taken
-        trial_numbers = list(range(1, len(df) + 1)) # Assignment of trial numbers through the length +1 of df
-        plt.plot(trial_numbers, df['score'], marker='o', color='purple', linewidth=2)
-        # Takes the trial_numbers as x-axis data | takes the score data array as the y-axis data
-        # marker for the adjustment of the data point shape
-        plt.title("Your Progress Over Time", fontsize=14)
-        plt.xlabel("Number of Exams")
-        plt.ylabel("Score")
-        plt.grid(True, linestyle='--', alpha=0.6)
-
-    else:
-        # Create a pie chart for the comparison of Passing vs. Failing counts
-        plt.pie([passed_count, failed_count], labels=['Pass', 'Fail'],
-                autopct='%1.1f%%', colors=['green', 'red'], startangle=140)
-        # 'autopct' formats the percentage labels
-        # - '1.1f': Display as a float (f) with 1 digit after the decimal.
-        # - '%%': Appends percentage sign to the value.
-        plt.title("Overall Pass/Fail Ratio", fontsize=14)
-
-    # Adjust layout to make sure titles and labels don't get cut off
-    plt.tight_layout()
-
-    # 6. --- IMAGE ENCODING: Convert the plot into a Base64 string for HTML rendering ---
-    buffer = io.BytesIO()
-    # Initialization of an in-memory byte stream to capture the image data without disk I/O
-    plt.savefig(buffer, format='png')
-    # Rendering and exporting the Matplotlib plot into the buffer in PNG format
-    buffer.seek(0)  # Reset buffer pointer to the beginning
-    # Rewinding the buffer pointer to the start to ensure the full data stream is read
-
-    chart_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-    # Encode the raw binary data to a Base64 string for direct embedding in an HTML <img> tag
-    # This converts the binary image into a UTF-8 compatible ASCII string
-    buffer.close()
-    # Shut the buffer off
+    chart_type = request.GET.get('chart_type', DEFAULT_CHART_TYPE)
+    # If no (or an unknown) type is specified it defaults to 'pie'.
+    if chart_type not in CHART_TYPES:
+        chart_type = DEFAULT_CHART_TYPE
+
+    # --- 5. DATA VISUALIZATION: The chart is drawn by charts.py and cached per (user, chart type, latest result),
+    # so it is only rendered once after every exam (or ahead of time, see charts.schedule_prerender).
+    with span("chart"):
+        png = get_user_chart(request.user.id, chart_type, latest[0])
+
+    # 6. --- IMAGE ENCODING: The page can load the image from chart_url (served with ETag/Last-Modified,
+    # so the browser keeps it), and "chart" keeps the inline Base64 version for templates that embed it.
+    with span("encode"):
+        chart_base64 = base64.b64encode(png).decode('utf-8')
+    chart_url = reverse('user_chart', args=[chart_type])
 
     # 7. --- SHOW ON SCREEN: Send everything to the 'user_stats.html' page. ---
-    return render(request, "exam_app/user_stats.html", {
-        "chart": chart_base64, # # Base64 encoded string representing the generated plot image for inline HTML rendering.
-        "chart_type": chart_type, # the chosen chart_type from pie - line - hist | assigned in part 4 and 5
-        "failed_questions": failed_questions,  # List of Wrong Answered Questions. | assigned in part 3
-        "avg_score": avg_score,  # Mean for the Specific User | assigned in part 1
-        "std_dev": std_dev,  # Standard Deviation | assigned in part 1
-        "max_score": max_score,  # Maximum Score | assigned in part 1
-        "consistency": consistency_score,  # Consistency Score | assigned in part 1
-        "total_exams": total_exams, # number of total exams | assigned in part 1
-        "success_rate": success_rate,  # Success Rate | assigned in part 1
-    })
\ No newline at end of file
+    with span("render"):
+        return render(request, "exam_app/user_stats.html", {
+            "chart": chart_base64, # # Base64 encoded string representing the generated plot image for inline HTML rendering.
+            "chart_url": chart_url, # URL of the same chart as a cacheable PNG | assigned in part 6
+            "chart_type": chart_type, # the chosen chart_type from pie - line - hist | assigned in part 4 and 5
+            "failed_questions": failed_questions,  # List of Wrong Answered Questions. | assigned in part 3
+            "avg_score": avg_score,  # Mean for the Specific User | assigned in part 1
+            "std_dev": std_dev,  # Standard Deviation | assigned in part 1
+            "max_score": max_score,  # Maximum Score | assigned in part 1
+            "consistency": consistency_score,  # Consistency Score | assigned in part 1
+            "total_exams": total_exams, # number of total exams | assigned in part 1
+            "success_rate": success_rate,  # Success Rate | assigned in part 1
+        })
+
+
+@login_required
+def user_chart_view(request, chart_type):
+    """
+    Serves one of the user's statistics charts as a PNG image.
+    The ETag and Last-Modified headers are derived from the user's latest ExamResult, so the browser
+    revalidates with one small query and gets "304 Not Modified" until the user takes another exam.
+    Input: GET request, chart_type ('pie', 'line' or 'histogram') from the URL.
+    Output: The PNG image, 304 if the browser's copy is current, or 404 for an unknown type / no results.
+    """
+    if chart_type not in CHART_TYPES:
+        raise Http404("Unknown chart type")
+    latest = latest_result(request.user.id)
+    if latest is None:
+        raise Http404("No exam results yet")
+    latest_id, latest_date = latest
+
+    etag = quote_etag(f"{request.user.id}-{chart_type}-{latest_id}")
+    last_modified = calendar.timegm(latest_date.utctimetuple())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(get_user_chart(request.user.id, chart_type, latest_id), content_type='image/png')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # The image is personal: only the user's own browser may keep it, and it has to ask again each time.
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _export_format(request):
+    # Unknown formats fall back to the original text report
+    fmt = request.GET.get('format', 'txt')
+    return fmt if fmt in exports.EXPORT_FORMATS else 'txt'
+
+
+def _int_param(request, name):
+    # Optional positive integer query parameter (pagination); anything else is ignored
+    value = request.GET.get(name, '')
+    return int(value) if value.isdigit() else None
+
+
+def report_download_response(request, chunks, basename):
+    """
+    Wraps a report generator into a streamed file download.
+    Input: request, chunks (generator of text from exports.py), basename (file name without extension).
+    Output: A StreamingHttpResponse; the browser starts receiving the file before the last row is read.
+    """
+    content_type, extension = exports.EXPORT_FORMATS[_export_format(request)]
+    response = StreamingHttpResponse(chunks, content_type=f"{content_type}; charset=utf-8")
+    # 'attachment' downloads to PC instead of displaying on HTML
+    response['Content-Disposition'] = f'attachment; filename="{basename}.{extension}"'
+    return response
+
+
+@staff_member_required
+def export_all_reports_view(request):
+    """
+    Streams the performance reports of all users in one file, for administrators.
+    Input: GET request with optional ?format=txt|csv|jsonl and ?after=<user id>&limit=<number of users> for paging.
+    Output: A streamed file download (see exports.iter_all_reports).
+    """
+    return report_download_response(request, exports.iter_all_reports(
+        _export_format(request), after_user=_int_param(request, 'after'), user_limit=_int_param(request, 'limit'),
+    ), "Performance_Reports_All_Users")
+
+
+@staff_member_required
+def timing_stats_view(request):
+    """
+    Shows the request timings collected by this worker process (see instrumentation.py), for administrators.
+    Input: GET request
+    Output: JSON {view name: {metric: {count, p50, p95, max}}}, or an explanation if the sink keeps no history.
+    """
+    sink = get_sink()
+    if not hasattr(sink, 'summary'):
+        return JsonResponse({"error": f"{type(sink).__name__} does not keep timings in memory"}, status=404)
+    return JsonResponse(sink.summary())
+
+
+# Sort orders of the item analysis: hardest first, or least discriminating first
+ITEM_ORDERS = {
+    'miss_rate': ['-miss_rate', 'question_id'],
+    'discrimination': ['discrimination', 'question_id'],
+}
+
+
+@staff_member_required
+@require_http_methods(["GET", "POST"])
+def item_analysis_view(request):
+    """
+    Shows the per-question difficulty statistics (QuestionStats), for administrators tuning the bank.
+    Input: GET request with optional ?order=miss_rate|discrimination and ?limit=<n> (default 100),
+    or a POST request to first add the exams taken since the last update (like the analyze_items command).
+    Output: JSON {watermark, refreshed (POST only), questions: [{question_id, text, attempts, miss_rate,
+    discrimination, top_distractor: {id, text, count}}, ...]}
+    """
+    refreshed = None
+    if request.method == "POST":
+        # Imported here: NumPy is only loaded by the worker that runs an update
+        from .analytics import refresh_question_stats
+        refreshed = refresh_question_stats()
+
+    order = ITEM_ORDERS.get(request.GET.get('order'), ITEM_ORDERS['miss_rate'])
+    rows = QuestionStats.objects.order_by(*order)
+    if order == ITEM_ORDERS['discrimination']:
+        rows = rows.filter(discrimination__isnull=False)
+    rows = list(rows[:_int_param(request, 'limit') or 100])
+
+    # Texts of the listed questions and distractors (two queries, also for retired questions)
+    texts = dict(Question.objects.filter(id__in=[r.question_id for r in rows]).values_list('id', 'text'))
+    choice_texts = dict(Choice.objects.filter(id__in=[r.top_distractor_id for r in rows if r.top_distractor_id])
+                        .values_list('id', 'text'))
+
+    data = {
+        "watermark": ProcessingWatermark.get('question_stats'),
+        "questions": [{
+            "question_id": r.question_id,
+            "text": texts.get(r.question_id),
+            "attempts": r.attempts,
+            "miss_rate": round(r.miss_rate, 4),
+            "discrimination": None if r.discrimination is None else round(r.discrimination, 4),
+            "top_distractor": None if r.top_distractor_id is None else {
+                "id": r.top_distractor_id,
+                "text": choice_texts.get(r.top_distractor_id),
+                "count": r.top_distractor_count,
+            },
+        } for r in rows],
+    }
+    if refreshed is not None:
+        data["refreshed"] = refreshed
+    return JsonResponse(data)
+
+
+def _cohort_params(request):
+    # ?period=day (default) | hour, ?periods=<number of days / hours> (default 30 days or 48 hours)
+    period = request.GET.get('period', 'day')
+    if period not in rollups.ExamRollup.PERIODS:
+        period = 'day'
+    count = _int_param(request, 'periods') or (30 if period == 'day' else 48)
+    return period, rollups.period_since(period, min(count, 3660))
+
+
+@staff_member_required
+def cohort_dashboard_view(request):
+    """
+    Cohort dashboard for instructors: pass rate and scores per day (or hour), the score distribution
+    and the leaderboard. Everything is read from the ExamRollup and UserExamStats tables (a few hundred
+    small rows), never from the ExamResult history; run the build_rollups command to update them.
+    Input: GET request with optional ?period=day|hour, ?periods=<n> and ?top=<number of users> (default 10).
+    Output: JSON {period, since, watermark, series: [...], distribution: [...], leaderboard: [...], charts: {...}}
+    """
+    period, since = _cohort_params(request)
+    rows = rollups.series(period, since)
+
+    data = {
+        "period": period,
+        "since": since.isoformat(),
+        # ID of the last ExamResult included; newer exams appear after the next build_rollups run
+        "watermark": ProcessingWatermark.get(rollups.WATERMARK_NAME),
+        "series": [{
+            "start": row.period_start.isoformat(),
+            "exams": row.exam_count,
+            "passed": row.passed_count,
+            "pass_rate": round(row.pass_rate, 2),
+            "mean": round(row.mean, 2),
+            "std_dev": round(row.std_dev, 2),
+        } for row in rows],
+        "distribution": rollups.distribution(rows),
+        "leaderboard": [{
+            "rank": rank,
+            "username": stats.user.username,
+            "exams": stats.exam_count,
+            "mean": round(stats.mean, 2),
+            "max_score": stats.max_score,
+            "success_rate": round(stats.success_rate, 1),
+        } for rank, stats in enumerate(UserExamStats.leaderboard(limit=min(_int_param(request, 'top') or 10, 100)), 1)],
+        # The same filters apply to the chart images
+        "charts": {chart_type: f"{reverse('cohort_chart', args=[chart_type])}?{request.GET.urlencode()}"
+                   for chart_type in COHORT_CHART_TYPES},
+    }
+    return JsonResponse(data)
+
+
+@staff_member_required
+def cohort_chart_view(request, chart_type):
+    """
+    Serves a chart of the cohort dashboard as a PNG image, cached like the user charts (see charts.py).
+    Input: GET request, chart_type ('pass_rate' or 'distribution') from the URL, ?period and ?periods like the dashboard.
+    Output: The PNG image (the ETag changes when the rollups do), 304 if the browser's copy is current, or 404.
+    """
+    if chart_type not in COHORT_CHART_TYPES:
+        raise Http404("Unknown chart type")
+    period, since = _cohort_params(request)
+    watermark = ProcessingWatermark.get(rollups.WATERMARK_NAME)
+
+    etag = quote_etag(f"cohort-{chart_type}-{period}-{since:%Y%m%d%H}-{watermark}")
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(get_cohort_chart(chart_type, period, since, watermark), content_type='image/png')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response